@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+import argparse
+import ast
+import json
+import re
+import sys
+
+
+# Padrões das linhas impressas pelo client.py
+TURN_RE = re.compile(r"-+ TURNO (\d+) -+")
+SHOOTING_RE = re.compile(r"-+ ATIRANDO -+")
+PHASE_RE = re.compile(r"-+ (.+?) -+")
+AUTH_RE = re.compile(r"(GAS autenticado|Não foi possivel autenticar GAS) no rio (\d+)")
+CANNONS_RE = re.compile(r"Canhões: (\[.*\])")
+# Clientes antigos listam todos os navios a cada turno; os atuais só as mudanças
+SHIP_RE = re.compile(
+    r"Navio \{'id': (\d+), 'hull': '(\w+)', 'hits': (\d+)\} no rio (\d+) ponte (\d+)\."
+)
+SHIP_ENTERED_RE = re.compile(r"Navio (\d+) \((\w+)\) entrou no rio (\d+) ponte (\d+)\.")
+SHIP_HIT_RE = re.compile(
+    r"Navio (\d+) no rio (\d+) ponte (\d+) foi atingido \((\d+)/(\d+)\)\."
+)
+SHIPS_MOVED_RE = re.compile(r"(\d+) navios avançaram no rio (\d+)\.")
+SHIP_LEFT_RE = re.compile(r"Navio (\d+) saiu do rio (\d+) na ponte (\d+) \((\w+)\)\.")
+MISMATCH_RE = re.compile(
+    r"Navio (\d+) no rio (\d+): (\d+) tiros contados localmente, (\d+) segundo o servidor"
+)
+HIT_RE = re.compile(r"Canhão (\[\d+, \d+\]) atirou no navio (\d+) com sucesso!")
+# Tiro retransmitido recusado por uma cópia: o cliente o mantém como acerto
+RESENT_HIT_RE = re.compile(
+    r"Canhão (\[\d+, \d+\]) retransmitiu o tiro no navio (\d+) e foi recusado"
+)
+MISS_RE = re.compile(
+    r"Canhão (\[\d+, \d+\]|None) tentou atirar no navio (.*?) e não conseguiu: (.*)"
+)
+TIMEOUT_RE = re.compile(r"Ocorreu um timeout ao tentar conexão com o servidor (\d+)")
+SOCKET_ERROR_RE = re.compile(r"An error occurred\. Retrying\.\.\. Socket error")
+SCORE_RE = re.compile(r"SCORE: (\{.*\})")
+GAMEOVER_RE = re.compile(r"JOGO (FINALIZADO|ENCERRADO)")
+
+
+def readLines(path):
+    """
+    Lê um transcript linha a linha (memória constante). "-" lê da entrada padrão.
+
+    Os transcripts podem ter bytes inválidos (saída de várias threads misturada),
+    então eles são substituídos em vez de interromper a leitura.
+    """
+    if path == "-":
+        stream = open(
+            sys.stdin.fileno(), encoding="utf-8", errors="replace", closefd=False
+        )
+    else:
+        stream = open(path, encoding="utf-8", errors="replace")
+    with stream:
+        for line in stream:
+            yield line.rstrip("\n")
+
+
+def parseEvents(lines):
+    """
+    Transforma as linhas de um transcript em eventos (tuplas cujo primeiro item é o
+    tipo do evento). Linhas não reconhecidas geram um evento "unparsed".
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+
+        match = SHIP_RE.search(line)
+        if match:
+            ship_id, hull, hits, river, bridge = match.groups()
+            # Rios e pontes aparecem numerados a partir de 1 no transcript
+            yield (
+                "ship",
+                int(river) - 1,
+                int(bridge) - 1,
+                int(ship_id),
+                hull,
+                int(hits),
+            )
+            continue
+
+        match = SHIP_ENTERED_RE.search(line)
+        if match:
+            ship_id, hull, river, bridge = match.groups()
+            yield ("entered", int(river) - 1, int(bridge) - 1, int(ship_id), hull)
+            continue
+
+        match = SHIP_HIT_RE.search(line)
+        if match:
+            ship_id, river, bridge, hits, life = match.groups()
+            yield ("ship_hit", int(river) - 1, int(bridge) - 1, int(ship_id), int(hits))
+            continue
+
+        match = SHIPS_MOVED_RE.search(line)
+        if match:
+            yield ("moved", int(match.group(2)) - 1, int(match.group(1)))
+            continue
+
+        match = SHIP_LEFT_RE.search(line)
+        if match:
+            ship_id, river, bridge, outcome = match.groups()
+            yield ("left", int(river) - 1, int(bridge) - 1, int(ship_id), outcome)
+            continue
+
+        match = MISMATCH_RE.search(line)
+        if match:
+            yield ("mismatch", int(match.group(2)) - 1, int(match.group(1)))
+            continue
+
+        match = TIMEOUT_RE.search(line)
+        if match:
+            yield ("timeout", int(match.group(1)))
+            continue
+
+        match = HIT_RE.search(line)
+        if match:
+            yield ("hit", match.group(1), int(match.group(2)))
+            continue
+
+        match = RESENT_HIT_RE.search(line)
+        if match:
+            yield ("hit", match.group(1), int(match.group(2)))
+            continue
+
+        match = MISS_RE.search(line)
+        if match:
+            yield ("miss", match.group(1), match.group(3))
+            continue
+
+        match = TURN_RE.search(line)
+        if match:
+            yield ("turn", int(match.group(1)))
+            continue
+
+        if SHOOTING_RE.search(line):
+            yield ("shooting",)
+            continue
+
+        match = AUTH_RE.search(line)
+        if match:
+            yield ("auth", int(match.group(2)), match.group(1) == "GAS autenticado")
+            continue
+
+        match = CANNONS_RE.search(line)
+        if match:
+            yield ("cannons", ast.literal_eval(match.group(1)))
+            continue
+
+        match = PHASE_RE.search(line)
+        if match:
+            yield ("phase", match.group(1))
+            continue
+
+        if SOCKET_ERROR_RE.search(line):
+            yield ("socket_error",)
+            continue
+
+        match = SCORE_RE.search(line)
+        if match:
+            try:
+                yield ("score", ast.literal_eval(match.group(1)))
+            except (ValueError, SyntaxError):
+                yield ("unparsed", line)
+            continue
+
+        match = GAMEOVER_RE.search(line)
+        if match:
+            yield ("gameover", line)
+            continue
+
+        yield ("unparsed", line)
+
+
+def _newTurn(turn):
+    return {
+        "turn": turn,
+        # Retransmissões por rio, separadas pela fase em que aconteceram
+        "getturn_retries": [0, 0, 0, 0],
+        "shot_retries": [0, 0, 0, 0],
+        "socket_errors": 0,
+        "ships_seen": [0, 0, 0, 0],
+        "shots_landed": [0, 0, 0, 0],
+        "shots_wasted": 0,
+        # Navios cujos tiros contados pelo cliente diferem dos do servidor
+        "hit_mismatches": 0,
+        "unparsed": 0,
+    }
+
+
+def turnStats(events):
+    """
+    Agrupa os eventos por turno e gera um dicionário de estatísticas para cada turno
+    assim que ele termina. Só o turno corrente fica em memória.
+
+    Eventos anteriores ao primeiro turno (autenticação e canhões) formam o turno -1,
+    cujas retransmissões são contadas em "getturn_retries".
+
+    Nos transcripts que só registram as mudanças dos navios (entrou, saiu), os navios
+    de cada rio são acompanhados entre os turnos para contar "ships_seen".
+    """
+    current = _newTurn(-1)
+    shooting = False
+    # Rio de cada navio visto no turno corrente (os acertos não informam o rio)
+    shipRivers = {}
+    # Rio de cada navio no tabuleiro, mantido entre os turnos a partir das mudanças
+    board = {}
+
+    def finish(stats):
+        for river in board.values():
+            stats["ships_seen"][river] += 1
+        return stats
+
+    for event in events:
+        kind = event[0]
+        if kind == "turn":
+            yield finish(current)
+            current = _newTurn(event[1])
+            shooting = False
+            shipRivers = {}
+        elif kind == "shooting":
+            shooting = True
+        elif kind == "ship":
+            _, river, _, ship_id, _, _ = event
+            current["ships_seen"][river] += 1
+            shipRivers[ship_id] = river
+        elif kind == "entered":
+            board[event[3]] = event[1]
+        elif kind == "left":
+            board.pop(event[3], None)
+        elif kind == "mismatch":
+            current["hit_mismatches"] += 1
+        elif kind == "timeout":
+            phase = "shot_retries" if shooting else "getturn_retries"
+            current[phase][event[1]] += 1
+        elif kind == "socket_error":
+            current["socket_errors"] += 1
+        elif kind == "hit":
+            river = shipRivers.get(event[2], board.get(event[2]))
+            if river is not None:
+                current["shots_landed"][river] += 1
+        elif kind == "miss":
+            current["shots_wasted"] += 1
+        elif kind == "unparsed":
+            current["unparsed"] += 1
+        elif kind == "score":
+            current["score"] = event[1]
+
+    yield finish(current)
+
+
+def summarize(turns):
+    """
+    Acumula as estatísticas por turno em totais por rio, sem guardar os turnos.
+    """
+    summary = {
+        "turns": 0,
+        "getturn_retries": [0, 0, 0, 0],
+        "shot_retries": [0, 0, 0, 0],
+        "socket_errors": 0,
+        "ships_seen": [0, 0, 0, 0],
+        "shots_landed": [0, 0, 0, 0],
+        "shots_wasted": 0,
+        "hit_mismatches": 0,
+        "unparsed": 0,
+        "max_retries_in_turn": 0,
+        "score": None,
+    }
+    for stats in turns:
+        if stats["turn"] >= 0:
+            summary["turns"] += 1
+        for key in ("getturn_retries", "shot_retries", "ships_seen", "shots_landed"):
+            for river in range(4):
+                summary[key][river] += stats[key][river]
+        for key in ("socket_errors", "shots_wasted", "hit_mismatches", "unparsed"):
+            summary[key] += stats[key]
+        retries = sum(stats["getturn_retries"]) + sum(stats["shot_retries"])
+        summary["max_retries_in_turn"] = max(summary["max_retries_in_turn"], retries)
+        # O transcript pode ter vários placares (um por rio): fica o último
+        if "score" in stats:
+            summary["score"] = stats["score"]
+    return summary
+
+
+def printSummary(path, summary):
+    print(f"== {path}")
+    print(f"turnos: {summary['turns']}")
+    print("rio                 1      2      3      4")
+    for key in ("getturn_retries", "shot_retries", "ships_seen", "shots_landed"):
+        print(f"{key:<16}" + "".join(f"{value:>7}" for value in summary[key]))
+    print(f"tiros desperdiçados: {summary['shots_wasted']}")
+    print(f"tiros divergentes do servidor: {summary['hit_mismatches']}")
+    print(f"erros de socket: {summary['socket_errors']}")
+    print(f"máximo de retransmissões em um turno: {summary['max_retries_in_turn']}")
+    print(f"linhas não reconhecidas: {summary['unparsed']}")
+    if summary["score"] is not None:
+        score = summary["score"]
+        print(
+            f"placar: {score.get('sunk_ships')} afundados,"
+            f" {score.get('escaped_ships')} escaparam,"
+            f" {score.get('valid_shots')}/{score.get('shot_received')} tiros válidos"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analisa transcripts do cliente (ipv4-*.txt, ipv6-*.txt) em streaming."
+    )
+    parser.add_argument(
+        "paths", nargs="+", help='transcripts ("-" para a entrada padrão)'
+    )
+    parser.add_argument(
+        "--per-turn",
+        action="store_true",
+        help="emite as estatísticas de cada turno como JSON (uma linha por turno)",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="emite o resumo de cada arquivo como JSON"
+    )
+    args = parser.parse_args()
+
+    for path in args.paths:
+        turns = turnStats(parseEvents(readLines(path)))
+        if args.per_turn:
+            for stats in turns:
+                print(json.dumps(stats))
+        elif args.json:
+            print(json.dumps({"path": path, **summarize(turns)}))
+        else:
+            printSummary(path, summarize(turns))
@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+from server import PROFILES, BridgeDefenseServer
+
+
+def loadClient(path):
+    """
+    Carrega uma versão de client.py a partir do caminho informado, permitindo comparar
+    versões diferentes do cliente com o mesmo benchmark.
+    """
+    spec = importlib.util.spec_from_file_location("benchmarked_client", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def requestKind(firstArgument):
+    """
+    Tipo da requisição a partir do primeiro argumento de _serverCommunication: o tipo
+    em si ou, nas versões sem mensagens pré-codificadas, o JSON da requisição.
+    """
+    if firstArgument.lstrip().startswith("{"):
+        return json.loads(firstArgument)["type"]
+    return firstArgument
+
+
+GAS = "2021421869:44:87407f792f59b7dde2bf51a0ae7216cf8c246a7169b52ac336bbf166938d91a1"
+
+# Resposta state típica, usada nas medidas de codec e de recepção
+STATE_DATAGRAM = json.dumps(
+    {
+        "type": "state",
+        "auth": GAS,
+        "turn": 10,
+        "bridge": 3,
+        "ships": [{"id": 17, "hull": "destroyer", "hits": 1}] * 2,
+    }
+).encode()
+
+
+def codecCost(module, repetitions=20000):
+    """
+    Mede o custo de CPU (em microssegundos por mensagem) de codificar as requisições
+    getturn e shot e de decodificar uma resposta state, com o codec da versão do
+    cliente (ou com json.dumps/json.loads nas versões que não têm MessageCodec).
+    """
+    gas = GAS
+    state = STATE_DATAGRAM
+
+    codec = getattr(module, "MessageCodec", None)
+    if codec is not None:
+        codec = codec(gas)
+
+        def encodeGetturn(turn):
+            return codec.getturn(turn)
+
+        def encodeShot(turn):
+            return codec.shot([3, 2], turn)
+
+        decode = module.decodeMessage
+    else:
+
+        def encodeGetturn(turn):
+            return json.dumps({"type": "getturn", "auth": gas, "turn": turn}).encode()
+
+        def encodeShot(turn):
+            message = {"type": "shot", "auth": gas, "cannon": [3, 2], "id": turn}
+            return json.dumps(message).encode()
+
+        def decode(data):
+            return json.loads(data.decode())
+
+    costs = {}
+    for name, function, argument in (
+        ("encode_getturn", encodeGetturn, None),
+        ("encode_shot", encodeShot, None),
+        ("decode_state", decode, state),
+    ):
+        start = time.perf_counter()
+        for k in range(repetitions):
+            function(state if argument is not None else k)
+        costs[name + "_us"] = 1e6 * (time.perf_counter() - start) / repetitions
+    return costs
+
+
+def receiveCost(module, datagrams=2000):
+    """
+    Mede com o tracemalloc a memória que o transport da versão do cliente aloca para
+    entregar datagramas ao protocolo (blocos e bytes por datagrama, incluindo os
+    buffers do próprio transport). O protocolo guarda o que recebe até o fim da medida,
+    para que as alocações de cada datagrama apareçam na diferença entre os snapshots.
+    """
+
+    class KeepingProtocol(asyncio.DatagramProtocol):
+        def __init__(self):
+            self.received = []
+
+        def datagram_received(self, data, addr):
+            self.received.append(data)
+
+    async def measure():
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender.bind(("127.0.0.1", 0))
+        sender.connect(receiver.getsockname())
+        receiver.connect(sender.getsockname())
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        # Versões sem BufferedDatagramTransport usam o transport do asyncio
+        openEndpoint = getattr(module, "openDatagramEndpoint", None)
+        if openEndpoint is not None:
+            transport, protocol = await openEndpoint(KeepingProtocol, receiver)
+        else:
+            (
+                transport,
+                protocol,
+            ) = await asyncio.get_running_loop().create_datagram_endpoint(
+                KeepingProtocol, sock=receiver
+            )
+        # Poucos datagramas em trânsito por vez, para não estourar o buffer do socket
+        sent = 0
+        while len(protocol.received) < datagrams:
+            while sent < datagrams and sent - len(protocol.received) < 64:
+                sender.send(STATE_DATAGRAM)
+                sent += 1
+            await asyncio.sleep(0)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        # As views do buffer precisam ser liberadas antes de fechar o transport
+        protocol.received.clear()
+        transport.close()
+        sender.close()
+        return before, after
+
+    before, after = asyncio.run(measure())
+    # As alocações do próprio benchmark (a lista do protocolo) ficam de fora
+    ignored = [
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ]
+    differences = after.filter_traces(ignored).compare_to(
+        before.filter_traces(ignored), "filename"
+    )
+    return {
+        "datagrams": datagrams,
+        "blocks_per_datagram": sum(stat.count_diff for stat in differences) / datagrams,
+        "bytes_per_datagram": sum(stat.size_diff for stat in differences) / datagrams,
+    }
+
+
+def instrumentedClass(module):
+    """
+    Cria uma subclasse de BridgeDefense que mede a latência de cada requisição, conta
+    os datagramas enviados (para calcular as retransmissões) e guarda o placar final.
+    """
+
+    class InstrumentedBridgeDefense(module.BridgeDefense):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = defaultdict(list)
+            self.requests = Counter()
+            self.datagrams = Counter()
+            self.turnStarts = []
+            self.score = None
+            # Transports dos rios e datagramas recebidos pelo transport do asyncio
+            self.transports = []
+            self.received = 0
+
+        async def _openEndpoints(self):
+            await super()._openEndpoints()
+            # Versões com happy eyeballs têm um conjunto de endpoints por família
+            paths = getattr(self, "_paths", None)
+            if paths is not None:
+                rivers = [river for path in paths for river in path.rivers]
+            else:
+                rivers = self._rivers
+            for river in rivers:
+                river.transport.sendto = self._countingSendto(river.transport.sendto)
+                self.transports.append(river.transport)
+                # Versões sem BufferedDatagramTransport não contam os datagramas recebidos
+                if not hasattr(river.transport, "stats"):
+                    river.datagram_received = self._countingReceive(
+                        river.datagram_received
+                    )
+
+        def _countingSendto(self, sendto):
+            def countingSendto(data, *args):
+                self.datagrams[json.loads(data)["type"]] += 1
+                return sendto(data, *args)
+
+            return countingSendto
+
+        def _countingReceive(self, datagramReceived):
+            def countingReceive(data, addr):
+                self.received += 1
+                return datagramReceived(data, addr)
+
+            return countingReceive
+
+        async def _serverCommunication(self, *args, **kwargs):
+            kind = requestKind(args[0])
+            self.requests[kind] += 1
+            start = time.perf_counter()
+            response = await super()._serverCommunication(*args, **kwargs)
+            self.latencies[kind].append(time.perf_counter() - start)
+            return response
+
+        async def _shotRequests(self, shots, *args):
+            self.requests["shot"] += len(shots)
+            start = time.perf_counter()
+            results = await super()._shotRequests(shots, *args)
+            # A latência de tiro é a de uma rodada completa de tiros do turno
+            if shots:
+                self.latencies["shot"].append(time.perf_counter() - start)
+            return results
+
+        async def _playTurn(self):
+            self.turnStarts.append(time.perf_counter())
+            return await super()._playTurn()
+
+        # Versões anteriores ao _playTurn começam cada turno pelo _turnStateRequest
+        async def _turnStateRequest(self):
+            self.turnStarts.append(time.perf_counter())
+            return await super()._turnStateRequest()
+
+        def _checkGameOver(self, dictResponse):
+            if dictResponse.get("type") == "gameover" and "score" in dictResponse:
+                self.score = dictResponse["score"]
+            return super()._checkGameOver(dictResponse)
+
+    return InstrumentedBridgeDefense
+
+
+def percentile(values, p):
+    """
+    Percentil pelo método nearest-rank (values precisa estar ordenado).
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[rank]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values) if values else None,
+        "p50_ms": 1000 * percentile(values, 50) if values else None,
+        "p95_ms": 1000 * percentile(values, 95) if values else None,
+        "p99_ms": 1000 * percentile(values, 99) if values else None,
+        "max_ms": 1000 * values[-1] if values else None,
+    }
+
+
+def runProfile(gameClass, profileName, seed, turns, host, port, options=None):
+    """
+    Joga uma partida completa contra um servidor local com o perfil informado.
+    options são argumentos extras para o construtor do cliente.
+    """
+    server = BridgeDefenseServer(PROFILES[profileName], seed, turns)
+    serverThread = threading.Thread(
+        target=asyncio.run, args=(server.serve(host, port),), daemon=True
+    )
+    serverThread.start()
+    # Dá tempo para o servidor abrir as portas
+    time.sleep(0.2)
+
+    game = gameClass(host, port, f"benchmark-{profileName}-{seed}", **(options or {}))
+    start = time.perf_counter()
+    try:
+        # A saída do jogo é descartada: só o custo de gerá-la entra na medida
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            game.playGame()
+    finally:
+        elapsed = time.perf_counter() - start
+        server.stop()
+        serverThread.join()
+
+    turnTimes = [b - a for a, b in zip(game.turnStarts, game.turnStarts[1:])]
+    playedTurns = max(len(game.turnStarts) - 1, 0)
+    retransmits = {
+        kind: max(game.datagrams[kind] - game.requests[kind], 0)
+        for kind in game.datagrams
+    }
+    # Respostas descartadas pelo cliente (atrasadas, duplicadas...), nas versões com métricas
+    dropped = Counter()
+    # Cópias extras do modo hedging (já incluídas nas retransmissões), por motivo
+    hedges = Counter()
+    if hasattr(game, "metrics"):
+        snapshot = game.metrics.snapshot()
+        for entry in snapshot.get("bridge_defense_dropped_replies_total", []):
+            dropped[entry["labels"]["reason"]] += entry["value"]
+        for entry in snapshot.get("bridge_defense_hedges_total", []):
+            hedges[entry["labels"]["kind"]] += entry["value"]
+
+    # Datagramas recebidos (e leituras em lote, nas versões com BufferedDatagramTransport)
+    receive = Counter()
+    for transport in game.transports:
+        receive.update(getattr(transport, "stats", {}))
+    if not receive:
+        receive = Counter(datagrams=game.received)
+
+    return {
+        "profile": profileName,
+        "network": PROFILES[profileName],
+        "seed": seed,
+        "turns": playedTurns,
+        "elapsed_s": elapsed,
+        "turns_per_second": playedTurns / sum(turnTimes) if turnTimes else None,
+        "turn_latency": summarize(turnTimes),
+        "latency": {
+            kind: summarize(values) for kind, values in sorted(game.latencies.items())
+        },
+        "requests": dict(game.requests),
+        "datagrams_sent": dict(game.datagrams),
+        "retransmits": retransmits,
+        "retransmits_total": sum(retransmits.values()),
+        "dropped_replies": dict(dropped),
+        "hedges": dict(hedges),
+        "receive": dict(receive),
+        "score": game.score,
+    }
+
+
+def printSummary(result):
+    turnsPerSecond = result["turns_per_second"] or 0.0
+    print(
+        f"[{result['profile']}] {result['turns']} turnos em {result['elapsed_s']:.2f} s"
+        f" ({turnsPerSecond:.1f} turnos/s), {result['retransmits_total']} retransmissões"
+    )
+    if result["dropped_replies"]:
+        print(
+            "    respostas descartadas: "
+            + ", ".join(
+                f"{reason}={n}"
+                for reason, n in sorted(result["dropped_replies"].items())
+            )
+        )
+    receive = result["receive"]
+    if receive.get("batches"):
+        print(
+            f"    recepção: {receive['datagrams']} datagramas em {receive['batches']} leituras"
+        )
+    elif receive.get("datagrams"):
+        print(f"    recepção: {receive['datagrams']} datagramas")
+    if result["hedges"]:
+        print(
+            "    cópias de hedging: "
+            + ", ".join(f"{kind}={n}" for kind, n in sorted(result["hedges"].items()))
+        )
+    for kind, stats in result["latency"].items():
+        print(
+            f"    {kind:<10} n={stats['count']:<5} p50={stats['p50_ms']:.2f} ms"
+            f" p95={stats['p95_ms']:.2f} ms p99={stats['p99_ms']:.2f} ms"
+        )
+    if result["score"] is not None:
+        print(
+            f"    placar: {result['score'].get('sunk_ships')} afundados,"
+            f" {result['score'].get('escaped_ships')} escaparam"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark de ponta a ponta do cliente contra o servidor local."
+    )
+    parser.add_argument(
+        "--client",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "client.py"),
+        help="versão de client.py a ser medida",
+    )
+    parser.add_argument(
+        "--profiles",
+        default="perfect,easy,hard",
+        help="perfis de rede separados por vírgula (%s)" % ", ".join(sorted(PROFILES)),
+    )
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=53000)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument(
+        "--hedge", action="store_true", help="mede o cliente com hedging (hedging=True)"
+    )
+    args = parser.parse_args()
+
+    clientModule = loadClient(args.client)
+    gameClass = instrumentedClass(clientModule)
+    with open(args.client, "rb") as clientFile:
+        clientHash = hashlib.sha256(clientFile.read()).hexdigest()
+
+    codec = codecCost(clientModule)
+    print(
+        "codec: "
+        + ", ".join(f"{name[:-3]}={cost:.2f} us" for name, cost in codec.items())
+    )
+    allocations = receiveCost(clientModule)
+    print(
+        f"recepção: {allocations['blocks_per_datagram']:.2f} blocos e"
+        f" {allocations['bytes_per_datagram']:.0f} bytes alocados por datagrama"
+        f" ({allocations['datagrams']} datagramas, tracemalloc)"
+    )
+
+    results = []
+    for k, profileName in enumerate(args.profiles.split(",")):
+        # Cada perfil usa portas novas para não receber datagramas atrasados do anterior
+        result = runProfile(
+            gameClass,
+            profileName,
+            args.seed,
+            args.turns,
+            args.host,
+            args.port + 10 * k,
+            {"hedging": True} if args.hedge else None,
+        )
+        printSummary(result)
+        results.append(result)
+
+    report = {
+        "client": os.path.abspath(args.client),
+        "client_sha256": clientHash,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "codec": codec,
+        "receive_allocations": allocations,
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Resultados salvos em {args.output}")
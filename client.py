@@ -1,342 +1,2696 @@
 #!/usr/bin/env python
+import argparse
+import asyncio
+from array import array
+import logging
+import logging.handlers
+import os
+import queue
 import socket
 import json
+import struct
 import sys
-from threading import Thread
+import time
+from collections import defaultdict, deque
+
+try:
+    # Backend JSON mais rápido, usado quando estiver instalado
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Tipo da resposta esperada para cada tipo de requisição
+RESPONSE_TYPES = {
+    "authreq": "authresp",
+    "getcannons": "cannons",
+    "getturn": "state",
+    "shot": "shotresp",
+    "quit": "gameover",
+}
+
+
+# Decodifica um datagrama (bytes ou memoryview) em dicionário, e codifica um valor em
+# bytes. O orjson lê direto do memoryview; o json precisa de uma cópia em bytes.
+if orjson is not None:
+    decodeMessage = orjson.loads
+    encodeValue = orjson.dumps
+else:
+
+    def decodeMessage(data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
+
+    def encodeValue(value):
+        return json.dumps(value, separators=(",", ":")).encode()
+
+
+# Tamanho do buffer de recepção (maior que qualquer resposta dos servidores) e máximo de
+# datagramas lidos de uma vez quando o socket fica legível
+RECEIVE_BUFFER_SIZE = 2048
+RECEIVE_BATCH = 64
+
+
+# Log do jogo. Sem configuração (BackgroundLogWriter) nada é escrito.
+logger = logging.getLogger("bridge_defense")
+logger.addHandler(logging.NullHandler())
+
+# Quantidade de tiros necessária para afundar cada tipo de navio
+HULL_LIFE = {"frigate": 1, "destroyer": 2, "battleship": 3}
+HULL_NAMES = {life: hull for hull, life in HULL_LIFE.items()}
+
+# Pesos do planejamento ótimo: afundar um navio vale mais que qualquer quantidade de dano,
+# e o dano vale mais que a preferência por navios mais próximos do fim do rio
+SINK_VALUE = 16.0
+HIT_VALUE = 1.0
+BRIDGE_VALUE = 1.0 / 16
+
+# Números das pontes nas mensagens state
+BRIDGE_NUMBERS = frozenset(range(1, 9))
+
+# Campos lidos de cada tipo de resposta e os tipos esperados para eles (as mensagens
+# state são verificadas ponte a ponte em _serverCommunication)
+REPLY_FIELDS = {
+    "authresp": {"status": int},
+    "cannons": {"cannons": list},
+    "shotresp": {"cannon": list, "id": int},
+    "gameover": {"status": int},
+}
+
+
+def validReply(dictResponse):
+    """
+    Verifica se a resposta tem um tipo e, com os tipos certos, os campos que o
+    cliente lê desse tipo. Respostas de tipos desconhecidos são aceitas aqui.
+    """
+    kind = dictResponse.get("type")
+    if not isinstance(kind, str):
+        return False
+    fields = REPLY_FIELDS.get(kind)
+    if fields is None:
+        return True
+    if not all(
+        isinstance(dictResponse.get(name), expected)
+        for name, expected in fields.items()
+    ):
+        return False
+    if dictResponse["type"] == "cannons":
+        return all(validPosition(cannon) for cannon in dictResponse["cannons"])
+    if dictResponse["type"] == "shotresp":
+        return validPosition(dictResponse["cannon"])
+    return True
+
+
+def validPosition(position):
+    return (
+        isinstance(position, list)
+        and len(position) == 2
+        and all(isinstance(value, int) for value in position)
+    )
+
+
+def validShip(ship):
+    return (
+        isinstance(ship, dict)
+        and isinstance(ship.get("id"), int)
+        and isinstance(ship.get("hull"), str)
+        and ship["hull"] in HULL_LIFE
+        and isinstance(ship.get("hits"), int)
+    )
+
+
+# Happy eyeballs (RFC 8305): atraso antes de tentar a próxima família de endereços
+CONNECTION_ATTEMPT_DELAY = 0.25
+# Peso de cada envio na taxa de perda de um caminho (média móvel exponencial)
+LOSS_RATE_ALPHA = 0.1
+# Taxa de perda a partir da qual o jogo troca de família de endereços, e quantos envios
+# precisam ser observados no caminho atual antes de considerar a troca
+FALLBACK_LOSS_RATE = 0.3
+FALLBACK_MIN_SAMPLES = 20
+
+# Hedging: requisições pequenas que podem ser enviadas em várias cópias, intervalo entre
+# as cópias, fração de tentativas sem resposta tolerada por rio e máximo de cópias. Os
+# tiros ficam de fora: o servidor aceita só a primeira cópia e conta as demais como
+# tiros inválidos ("cannon already shot this turn")
+HEDGED_TYPES = frozenset(("getturn",))
+HEDGE_STAGGER = 0.005
+HEDGE_TARGET_FAILURE = 0.05
+HEDGE_MAX_COPIES = 3
+
+# Tempo máximo (em segundos) de cada fase: autenticação e canhões (startup), estado do
+# turno (getturn), turno inteiro, incluindo os tiros (turn), e confirmação do quit. None
+# deixa a fase sem limite.
+DEFAULT_BUDGETS = {"startup": 30.0, "getturn": 6.0, "turn": 10.0, "quit": 2.0}
+# Fase (chave de DEFAULT_BUDGETS) cujo prazo limita cada tipo de requisição
+REQUEST_PHASES = {
+    "authreq": "startup",
+    "getcannons": "startup",
+    "getturn": "getturn",
+    "shot": "turn",
+    "quit": "quit",
+}
+# Turnos seguidos sem o estado de nenhum rio até o jogo ser abandonado
+MAX_SILENT_TURNS = 3
+
+
+class GameOver(Exception):
+    """
+    Lançada quando algum servidor responde com uma mensagem de game over.
+    """
+
+    def __init__(self, dictResponse):
+        super().__init__(dictResponse.get("description", "gameover"))
+        self.status = dictResponse["status"]
+        self.score = dictResponse.get("score")
+        self.description = dictResponse.get("description")
+
+
+class DeadlineExceeded(Exception):
+    """
+    Lançada quando o tempo de uma fase (ver DEFAULT_BUDGETS) acaba antes da resposta.
+    """
+
+    def __init__(self, phase):
+        super().__init__(f"tempo da fase {phase} esgotado")
+        self.phase = phase
+
+
+def earliestDeadline(*deadlines):
+    """
+    O prazo mais próximo entre os informados (None significa sem prazo).
+    """
+    deadlines = [deadline for deadline in deadlines if deadline is not None]
+    return min(deadlines) if deadlines else None
+
+
+def boundedTimeout(timeout, deadline):
+    """
+    Limita a espera de uma tentativa (None: sem limite) ao tempo que ainda resta até
+    o prazo.
+    """
+    if deadline is None:
+        return timeout
+    remaining = max(deadline - time.monotonic(), 0.0)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class RingBufferHandler(logging.handlers.QueueHandler):
+    """
+    Handler que apenas coloca os registros de log em um buffer circular limitado.
+
+    A escrita de verdade é feita por uma thread em segundo plano (QueueListener), então
+    o event loop nunca espera pelo console ou pelo arquivo. Se o buffer encher, os
+    registros mais antigos são descartados (e contados) em vez de bloquear o jogo.
+    """
+
+    def __init__(self, capacity):
+        super().__init__(queue.Queue(capacity))
+        self.dropped = 0
+
+    def enqueue(self, record):
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class BackgroundLogWriter:
+    """
+    Configura o log do jogo com o nível informado, escrevendo no console (ou no
+    arquivo informado) a partir de uma thread em segundo plano.
+
+    Por padrão (INFO) as mensagens por navio e os tiros bem sucedidos (DEBUG) ficam
+    desligados. stop() deve ser chamado no fim do jogo para escrever o que restou no buffer.
+    """
+
+    def __init__(self, level=logging.INFO, logFile=None, capacity=10000):
+        if logFile is None:
+            self._target = logging.StreamHandler(sys.stdout)
+        else:
+            self._target = logging.FileHandler(logFile, encoding="utf-8")
+        self._target.setFormatter(logging.Formatter("%(message)s"))
+        self._handler = RingBufferHandler(capacity)
+        self._listener = logging.handlers.QueueListener(
+            self._handler.queue, self._target
+        )
+        self._level = level
+
+    def start(self):
+        logger.addHandler(self._handler)
+        logger.setLevel(self._level)
+        logger.propagate = False
+        self._listener.start()
+
+    def stop(self):
+        logger.removeHandler(self._handler)
+        self._listener.stop()
+        if self._handler.dropped:
+            self._target.handle(
+                logging.makeLogRecord(
+                    {
+                        "msg": "%d mensagens de log descartadas (buffer cheio)",
+                        "args": (self._handler.dropped,),
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                    }
+                )
+            )
+        self._target.close()
+
+
+# Métricas coletadas pelo cliente: nome -> (tipo, descrição)
+METRICS = {
+    "bridge_defense_request_seconds": (
+        "histogram",
+        "Latência das requisições (do primeiro envio à resposta), por rio e tipo.",
+    ),
+    "bridge_defense_timeouts_total": (
+        "counter",
+        "Timeouts (seguidos de retransmissão), por rio e tipo de requisição.",
+    ),
+    "bridge_defense_socket_errors_total": (
+        "counter",
+        "Erros de socket, por rio e tipo de requisição.",
+    ),
+    "bridge_defense_shots_sent_total": (
+        "counter",
+        "Datagramas de tiro enviados (incluindo retransmissões), por rio.",
+    ),
+    "bridge_defense_shots_acked_total": (
+        "counter",
+        "Tiros respondidos pelo servidor, por rio.",
+    ),
+    "bridge_defense_shots_failed_total": (
+        "counter",
+        "Tiros recusados pelo servidor, por rio.",
+    ),
+    "bridge_defense_phase_seconds": (
+        "histogram",
+        "Tempo gasto em cada fase do jogo (auth, cannons, getturn, turn); a fase"
+        " cannons é só a espera pelos canhões depois da autenticação (eles são pedidos"
+        " durante ela), getturn é o tempo até ter o estado do turno dos quatro rios, e"
+        " turn é o turno inteiro (os tiros começam antes do fim do getturn).",
+    ),
+    "bridge_defense_turns_total": ("counter", "Turnos jogados."),
+    "bridge_defense_budget_exhausted_total": (
+        "counter",
+        "Fases que esgotaram o tempo, por fase e decisão tomada: partial_state (o turno"
+        " segue sem o estado de um rio), skip_shots (tiros sem resposta são abandonados)"
+        " ou abort (o jogo é encerrado).",
+    ),
+    "bridge_defense_hit_mismatches_total": (
+        "counter",
+        "Navios cujos tiros contados localmente diferem dos informados pelo servidor no"
+        " turno seguinte, por rio.",
+    ),
+    "bridge_defense_hedges_total": (
+        "counter",
+        "Cópias extras enviadas no modo hedging, por rio, tipo e motivo: copy (cópias"
+        " redundantes) ou percentile (resposta mais lenta que o percentil de latência).",
+    ),
+    "bridge_defense_dropped_replies_total": (
+        "counter",
+        "Respostas descartadas, por rio e motivo: stale (de uma requisição anterior),"
+        " duplicate (já recebida), turn (de outro turno), type (de outro tipo),"
+        " auth (de outro GAS) e invalid (sem os campos esperados).",
+    ),
+    "bridge_defense_address_fallbacks_total": (
+        "counter",
+        "Trocas de família de endereços (IPv4/IPv6) durante o jogo, por família de destino.",
+    ),
+}
+
+
+class Metrics:
+    """
+    Contadores e histogramas do jogo, coletados no próprio processo.
+
+    Podem ser lidos como um dicionário (snapshot, que vira JSON) ou no formato texto
+    do Prometheus (prometheus). Os rótulos são passados como argumentos nomeados.
+    """
+
+    # Limites superiores (em segundos) dos buckets dos histogramas
+    BUCKETS = (
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(self):
+        # nome -> {rótulos: valor} e nome -> {rótulos: [contagens dos buckets, soma, total]}
+        self._counters = {}
+        self._histograms = {}
+        self.startedAt = time.time()
+
+    def increment(self, name, value=1, **labels):
+        values = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        values = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = values.get(key)
+        if histogram is None:
+            histogram = values[key] = [[0] * len(self.BUCKETS), 0.0, 0]
+        for k, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                histogram[0][k] += 1
+                break
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    def snapshot(self):
+        """
+        Retorna uma cópia das métricas como um dicionário serializável em JSON.
+        """
+        snapshot = {"timestamp": time.time(), "started_at": self.startedAt}
+        for name, values in self._counters.items():
+            snapshot[name] = [
+                {"labels": dict(key), "value": value} for key, value in values.items()
+            ]
+        for name, values in self._histograms.items():
+            snapshot[name] = [
+                {
+                    "labels": dict(key),
+                    "buckets": dict(zip(map(str, self.BUCKETS), counts)),
+                    "sum": total,
+                    "count": count,
+                }
+                for key, (counts, total, count) in values.items()
+            ]
+        return snapshot
+
+    def prometheus(self):
+        """
+        Retorna as métricas no formato texto de exposição do Prometheus.
+        """
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            values = (self._counters if kind == "counter" else self._histograms).get(
+                name
+            )
+            if not values:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values.items()):
+                if kind == "counter":
+                    lines.append(f"{name}{_promLabels(key)} {value}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucketCount in zip(self.BUCKETS, counts):
+                    cumulative += bucketCount
+                    lines.append(
+                        f"{name}_bucket{_promLabels(key + (('le', bound),))} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_bucket{_promLabels(key + (('le', '+Inf'),))} {count}"
+                )
+                lines.append(f"{name}_sum{_promLabels(key)} {total}")
+                lines.append(f"{name}_count{_promLabels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _promLabels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{value}"' for label, value in key) + "}"
+
+
+class MetricsExporter:
+    """
+    Escreve periodicamente as métricas em um arquivo JSON e/ou em um arquivo texto no
+    formato do Prometheus (por exemplo para o textfile collector do node_exporter).
+
+    Os arquivos são substituídos atomicamente e escritos fora do event loop.
+    """
+
+    def __init__(self, metrics, jsonPath=None, prometheusPath=None, interval=5.0):
+        self._metrics = metrics
+        self._jsonPath = jsonPath
+        self._prometheusPath = prometheusPath
+        self._interval = interval
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self._interval)
+            await loop.run_in_executor(None, self.write, *self._render())
+
+    def _render(self):
+        # O snapshot é montado no event loop, onde as métricas são atualizadas
+        snapshot = self._metrics.snapshot() if self._jsonPath else None
+        text = self._metrics.prometheus() if self._prometheusPath else None
+        return snapshot, text
+
+    def write(self, snapshot=None, text=None):
+        if snapshot is None and text is None:
+            snapshot, text = self._render()
+        if self._jsonPath:
+            _writeAtomically(self._jsonPath, json.dumps(snapshot, indent=2))
+        if self._prometheusPath:
+            _writeAtomically(self._prometheusPath, text)
+
+
+def _writeAtomically(path, content):
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "w", encoding="utf-8") as output:
+        output.write(content)
+    os.replace(temporaryPath, path)
+
+
+class RttEstimator:
+    """
+    Estima o RTT de um rio no estilo Jacobson/Karels (RFC 6298) e calcula a partir
+    dele o timeout de retransmissão, com backoff exponencial limitado.
+
+    Seguindo o algoritmo de Karn, só devem ser amostradas respostas de requisições
+    que não foram retransmitidas (nas demais não se sabe a qual envio a resposta
+    corresponde).
+    """
+
+    def __init__(self, initialTimeout=0.4, minTimeout=0.05, maxTimeout=3.0):
+        self._minTimeout = minTimeout
+        self._maxTimeout = maxTimeout
+        self._srtt = None
+        self._rttvar = None
+        self._rto = initialTimeout
+        self._backoff = 1
+
+    @property
+    def timeout(self):
+        """
+        Timeout atual (em segundos) para esperar uma resposta deste rio.
+        """
+        return min(self._rto * self._backoff, self._maxTimeout)
+
+    def sample(self, rtt):
+        """
+        Atualiza as estimativas com uma nova medida de RTT (em segundos).
+        """
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            # alpha = 1/8 e beta = 1/4, como na RFC 6298
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        self._rto = min(
+            max(self._srtt + 4 * self._rttvar, self._minTimeout), self._maxTimeout
+        )
+        # Uma resposta válida encerra o backoff
+        self._backoff = 1
+
+    def backoff(self):
+        """
+        Dobra o timeout após uma tentativa sem nenhuma resposta (até o limite máximo).
+        """
+        if self._rto * self._backoff < self._maxTimeout:
+            self._backoff *= 2
+
+    def progress(self):
+        """
+        Encerra o backoff quando chega uma resposta nova que não pode ser amostrada
+        (de uma requisição retransmitida): o rio está respondendo, então o timeout volta
+        a ser o estimado pelo RTT.
+        """
+        self._backoff = 1
+
+    @property
+    def hedgeDelay(self):
+        """
+        Atraso a partir do qual uma resposta é considerada lenta (SRTT + 2 RTTVAR, um
+        percentil alto da latência), sem passar do timeout atual.
+        """
+        if self._srtt is None:
+            return self.timeout / 2
+        return min(self._srtt + 2 * self._rttvar, self.timeout)
+
+
+class RedundancyController:
+    """
+    Escolhe quantas cópias de cada requisição pequena enviar a um rio no modo hedging.
+
+    A fração (média móvel) de tentativas que terminam em timeout é comparada com
+    HEDGE_TARGET_FAILURE: acima do dobro do alvo uma cópia é acrescentada, e abaixo da
+    metade uma é retirada. Após cada mudança a fração volta ao alvo e só é reavaliada
+    depois de minSamples tentativas, para medir o efeito da nova quantidade.
+    """
+
+    def __init__(self, minSamples=20):
+        self.copies = 1
+        self.failureRate = 0.0
+        self._minSamples = minSamples
+        self._samples = 0
+
+    def record(self, lost):
+        self._samples += 1
+        self.failureRate += LOSS_RATE_ALPHA * (
+            (1.0 if lost else 0.0) - self.failureRate
+        )
+        if self._samples < self._minSamples:
+            return
+        if (
+            self.failureRate > 2 * HEDGE_TARGET_FAILURE
+            and self.copies < HEDGE_MAX_COPIES
+        ):
+            self.copies += 1
+        elif self.failureRate < HEDGE_TARGET_FAILURE / 2 and self.copies > 1:
+            self.copies -= 1
+        else:
+            return
+        self.failureRate = HEDGE_TARGET_FAILURE
+        self._samples = 0
+
+
+class Hedge:
+    """
+    Cópia extra de uma requisição, enviada uma única vez se a resposta não tiver
+    chegado até o instante at.
+    """
+
+    def __init__(self, at, resend):
+        self.at = at
+        self.fired = False
+        self._resend = resend
+
+    def fire(self):
+        self.fired = True
+        self._resend("percentile")
+
+
+class MessageCodec:
+    """
+    Mensagens de um GAS já codificadas em bytes.
+
+    As partes constantes (tipo e GAS) são codificadas uma única vez; a cada requisição
+    só o turno, ou o canhão e o id do navio, são formatados.
+    """
+
+    def __init__(self, gas):
+        auth = encodeValue(gas)
+        self.authreq = b'{"type":"authreq","auth":%s}' % auth
+        self.getcannons = b'{"type":"getcannons","auth":%s}' % auth
+        self.quit = b'{"type":"quit","auth":%s}' % auth
+        self._getturn = b'{"type":"getturn","auth":%s,"turn":' % auth
+        self._shot = b'{"type":"shot","auth":%s,"cannon":[' % auth
+
+    def getturn(self, turn):
+        return b"%s%d}" % (self._getturn, turn)
+
+    def shot(self, cannon, ship_id):
+        return b'%s%d,%d],"id":%d}' % (self._shot, cannon[0], cannon[1], ship_id)
+
+
+class RiverProtocol(asyncio.DatagramProtocol):
+    """
+    Endpoint UDP de um rio: decodifica cada datagrama recebido (uma única vez) e o
+    guarda em uma fila até que a corrotina que fez a requisição o consuma.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self._queue = asyncio.Queue()
+        # Gravação dos datagramas (DatagramRecorder) e a chave (família, rio) deste endpoint
+        self.recorder = None
+        self.recordKey = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def send(self, data):
+        if self.recorder is not None:
+            self.recorder.record(SENT, self.recordKey, data)
+        self.transport.sendto(data)
+
+    def datagram_received(self, data, addr):
+        if self.recorder is not None:
+            self.recorder.record(RECEIVED, self.recordKey, data)
+        try:
+            message = decodeMessage(data)
+        except ValueError:
+            # Datagramas que não são JSON válido são descartados
+            return
+        self._queue.put_nowait(message)
+
+    def deliver(self, message, data):
+        """
+        Coloca na fila uma mensagem já decodificada (por um SharedRiverProtocol) a
+        partir do datagrama data.
+        """
+        if self.recorder is not None:
+            self.recorder.record(RECEIVED, self.recordKey, data)
+        self._queue.put_nowait(message)
+
+    def error_received(self, exc):
+        # Erros ICMP (ex.: porta inalcançável) são entregues para quem está esperando
+        self._queue.put_nowait(exc)
+
+    async def receive(self):
+        data = await self._queue.get()
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+    def discardPending(self):
+        """
+        Descarta respostas atrasadas de requisições anteriores que ainda estejam
+        na fila, para que não sejam confundidas com a resposta da próxima.
+
+        Retorna quantas respostas foram descartadas.
+        """
+        discarded = 0
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            discarded += 1
+        return discarded
+
+
+# Formato da gravação: cabeçalho do arquivo e, para cada datagrama, instante (time.time),
+# direção, família (4 ou 6), rio e tamanho, seguidos do próprio datagrama. Os grupos de
+# canhões planejados em cada turno (PLANNED) são gravados com a chave PLAN_KEY.
+RECORD_MAGIC = b"BDREC\x01"
+RECORD_HEADER = struct.Struct("<dBBBH")
+SENT = 0
+RECEIVED = 1
+PLANNED = 2
+PLAN_KEY = (0, 0)
+
+
+def familyCode(family):
+    return 6 if family == socket.AF_INET6 else 4
+
+
+class DatagramRecorder:
+    """
+    Grava em um arquivo binário (só com acréscimos no final) todos os datagramas
+    enviados e recebidos pelo cliente, com o instante de cada um.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(RECORD_MAGIC)
+
+    def record(self, direction, key, data):
+        family, river = key
+        self._file.write(
+            RECORD_HEADER.pack(time.time(), direction, family, river, len(data))
+        )
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+
+def readRecording(path):
+    """
+    Lê uma gravação feita pelo DatagramRecorder, gerando tuplas
+    (instante, direção, (família, rio), datagrama).
+    """
+    with open(path, "rb") as recording:
+        if recording.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise ValueError(f"{path} não é uma gravação do cliente")
+        while True:
+            header = recording.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, direction, family, river, size = RECORD_HEADER.unpack(header)
+            data = recording.read(size)
+            if len(data) < size:
+                # Gravação interrompida no meio de um datagrama
+                return
+            yield timestamp, direction, (family, river), data
+
+
+class ReplayTransport:
+    """
+    Transport de um rio durante a reprodução: os envios não vão para a rede, mas
+    fazem o DatagramReplay entregar as respostas gravadas ao endpoint.
+    """
+
+    def __init__(self, replay, key, protocol):
+        self._replay = replay
+        self._key = key
+        self._protocol = protocol
+
+    def sendto(self, data, addr=None):
+        self._replay.sent(self._key, data, self._protocol)
+
+    def close(self):
+        pass
+
+
+class DatagramReplay:
+    """
+    Reproduz uma gravação sem rede. Cada envio do cliente em um rio corresponde ao
+    primeiro envio gravado idêntico nesse rio ainda não usado (a ordem dos tiros de
+    uma rajada pode mudar), e as respostas gravadas depois dele são entregues ao
+    endpoint, cada uma uma única vez. Envios gravados que o cliente não repetiu (ex.: um
+    getcannons que a gravação mandou a um rio que autenticou antes) ficam sem uso com as
+    suas respostas, e envios do cliente que não estão na gravação são tratados como
+    perdidos (sem resposta), exceto os tiros, recusados na hora para que a reprodução
+    não espere pelo fim do turno. Retransmissões gravadas de um getturn são puladas e
+    as respostas que vieram depois delas também são entregues, para que a reprodução
+    não espere pelos timeouts da gravação; as de tiros esperam a retransmissão do
+    cliente (ver _deliver).
+
+    Os canhões atiram nos mesmos grupos da gravação (ver plannedGroups), e não nos
+    grupos formados pela ordem de chegada dos estados na reprodução.
+
+    Com speed=None as respostas são entregues imediatamente; senão, respeitando os
+    atrasos gravados divididos por speed. Quando o último envio gravado no rio já foi
+    usado, o rio responde com um game over.
+    """
+
+    def __init__(self, path, speed=None):
+        self._speed = speed
+        self._events = defaultdict(list)
+        # Posições dos envios gravados ainda não usados, por rio e datagrama
+        self._sends = defaultdict(lambda: defaultdict(deque))
+        # Grupos de canhões planejados em cada turno, na ordem da gravação
+        self._plans = None
+        for timestamp, direction, key, data in readRecording(path):
+            if direction == PLANNED:
+                plan = decodeMessage(data)
+                if self._plans is None:
+                    self._plans = defaultdict(deque)
+                self._plans[plan["turn"]].append(plan["cannons"])
+                continue
+            if direction == SENT:
+                self._sends[key][data].append(len(self._events[key]))
+            self._events[key].append((timestamp, direction, data))
+        # Posição do último envio gravado e do último já usado em cada rio
+        self._lastSent = {
+            key: max(k for datagrams in sends.values() for k in datagrams)
+            for key, sends in self._sends.items()
+        }
+        self._lastUsed = defaultdict(lambda: -1)
+        # Posições das respostas gravadas já entregues
+        self._delivered = defaultdict(set)
+        # Datagramas já enviados pelo cliente na requisição (ou rajada de tiros) atual, e
+        # a retransmissão de tiro gravada em que a entrega parou (ver _deliver)
+        self._outstanding = defaultdict(set)
+        self._resume = {}
+        # Envios do cliente que não estão na gravação (cada datagrama contado uma vez)
+        self._lost = defaultdict(set)
+        self.mismatches = 0
+
+    def openPaths(self):
+        """
+        Cria um AddressPath por família presente na gravação (IPv6 primeiro), com
+        endpoints ligados a ReplayTransports em vez de sockets.
+        """
+        paths = []
+        for code, family in ((6, socket.AF_INET6), (4, socket.AF_INET)):
+            if not any(key[0] == code for key in self._events):
+                continue
+            path = AddressPath(family, "replay")
+            for i in range(4):
+                river = RiverProtocol()
+                river.connection_made(ReplayTransport(self, (code, i), river))
+                path.rivers.append(river)
+            paths.append(path)
+        return paths
+
+    def plannedGroups(self, turn):
+        """
+        Fila dos grupos de canhões (índices do CoverageIndex) planejados no turno, ou
+        None se a gravação não tem os planejamentos (feita por uma versão anterior).
+        """
+        if self._plans is None:
+            return None
+        return self._plans.pop(turn, deque())
+
+    def sent(self, key, data, protocol):
+        if data in self._outstanding[key]:
+            # Retransmissão do próprio cliente: segue a gravação a partir da retransmissão
+            # gravada em que ela parou (se houver), senão as respostas já foram entregues
+            resume = self._resume.pop(key, None)
+            if resume is not None:
+                self._deliver(key, resume, protocol, resumed=True)
+            return
+        candidates = self._sends[key].get(data)
+        if not candidates:
+            loop = asyncio.get_running_loop()
+            if self._lastUsed[key] >= self._lastSent.get(key, -1):
+                loop.call_soon(
+                    protocol.deliver,
+                    {"type": "gameover", "status": 1, "description": "Fim da gravação"},
+                    b"",
+                )
+                return
+            if data not in self._lost[key]:
+                self._lost[key].add(data)
+                self.mismatches += 1
+            message = decodeMessage(data)
+            if message.get("type") == "shot":
+                # Tiro que não está na gravação: recusado na hora, sem esperar o turno
+                loop.call_soon(
+                    protocol.deliver,
+                    {
+                        "type": "shotresp",
+                        "cannon": message.get("cannon"),
+                        "id": message.get("id"),
+                        "status": 1,
+                        "description": "tiro fora da gravação",
+                    },
+                    b"",
+                )
+            # Os demais envios ficam sem resposta, como numa perda
+            return
+
+        k = candidates.popleft()
+        self._lastUsed[key] = max(self._lastUsed[key], k)
+
+        # Só os tiros são enviados em rajadas; qualquer outra requisição começa uma nova
+        outstanding = self._outstanding[key]
+        if decodeMessage(data).get("type") != "shot":
+            outstanding.clear()
+            self._resume.pop(key, None)
+        outstanding.add(data)
+        self._deliver(key, k, protocol)
+
+    def _deliver(self, key, k, protocol, resumed=False):
+        """
+        Entrega as respostas gravadas depois do envio na posição k do rio, até o próximo
+        envio gravado de outra requisição.
+
+        As retransmissões gravadas da requisição atual são puladas, exceto as de tiros:
+        a resposta a um tiro retransmitido pode ser a recusa de uma cópia ("cannon
+        already shot this turn"), que o cliente só interpreta certo se também tiver
+        retransmitido. Por isso a entrega para na retransmissão de um tiro (a não ser
+        que seja a primeira da rodada da qual o cliente acabou de retransmitir, com
+        resumed=True) e continua dela quando o cliente retransmitir.
+        """
+        events = self._events[key]
+        sends = self._sends[key]
+        outstanding = self._outstanding[key]
+        sentAt = events[k][0]
+        received = False
+        k += 1
+
+        # Cada resposta é atrasada pelo tempo desde o último envio gravado antes dela, o
+        # que tira da reprodução as esperas por timeout da gravação
+        replies = []
+        delivered = self._delivered[key]
+        while k < len(events):
+            timestamp, direction, datagram = events[k]
+            if direction == RECEIVED:
+                received = True
+                if k not in delivered:
+                    delivered.add(k)
+                    replies.append((max(timestamp - sentAt, 0.0), datagram))
+            elif datagram in outstanding:
+                # A retransmissão gravada não pode corresponder a um envio posterior
+                if k in sends[datagram]:
+                    sends[datagram].remove(k)
+                self._lastUsed[key] = max(self._lastUsed[key], k)
+                if (not resumed or received) and decodeMessage(datagram).get(
+                    "type"
+                ) == "shot":
+                    self._resume[key] = k
+                    break
+                sentAt = timestamp
+            else:
+                break
+            k += 1
+
+        loop = asyncio.get_running_loop()
+        for delay, reply in replies:
+            if self._speed is None:
+                loop.call_soon(protocol.datagram_received, reply, None)
+            else:
+                loop.call_later(
+                    delay / self._speed, protocol.datagram_received, reply, None
+                )
+
+
+class BufferedDatagramTransport:
+    """
+    Transport de um socket UDP conectado que recebe com recv_into em um buffer
+    pré-alocado, em vez do recvfrom do asyncio (que cria um bytes por datagrama).
+
+    Quando o socket fica legível, até RECEIVE_BATCH datagramas são lidos de uma vez
+    (as oito respostas de um getturn costumam chegar juntas), e cada um é entregue ao
+    protocolo como um memoryview do buffer, válido só durante datagram_received: o
+    protocolo precisa decodificá-lo (ou gravá-lo) antes de retornar.
+    """
+
+    def __init__(self, loop, sock, protocol):
+        self._loop = loop
+        self._sock = sock
+        self._protocol = protocol
+        self._buffer = bytearray(RECEIVE_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        # Datagramas recebidos e leituras em lote (ver benchmark.py para as alocações)
+        self.stats = {"datagrams": 0, "batches": 0}
+        sock.setblocking(False)
+        loop.add_reader(sock.fileno(), self._readReady)
+        protocol.connection_made(self)
+
+    def _readReady(self):
+        self.stats["batches"] += 1
+        for _ in range(RECEIVE_BATCH):
+            try:
+                size = self._sock.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as exc:
+                # Erros ICMP (ex.: porta inalcançável) aparecem na leitura do socket
+                self._protocol.error_received(exc)
+                return
+            self.stats["datagrams"] += 1
+            self._protocol.datagram_received(self._view[:size], None)
+
+    def sendto(self, data, addr=None):
+        try:
+            self._sock.send(data)
+        except (BlockingIOError, InterruptedError):
+            # Buffer de envio cheio: o datagrama é perdido, como na rede (a retransmissão
+            # cuida dele)
+            pass
+        except OSError as exc:
+            self._protocol.error_received(exc)
+
+    def close(self):
+        if self._sock.fileno() == -1:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._view.release()
+        self._sock.close()
+        self._protocol.connection_lost(None)
+
+
+async def openDatagramEndpoint(protocolFactory, sock):
+    """
+    Cria o endpoint de um socket UDP conectado com um BufferedDatagramTransport, ou
+    com o transport do asyncio nos event loops sem add_reader (ex.: Proactor).
+
+    Retorna (transport, protocolo), como loop.create_datagram_endpoint.
+    """
+    loop = asyncio.get_running_loop()
+    protocol = protocolFactory()
+    try:
+        return BufferedDatagramTransport(loop, sock, protocol), protocol
+    except NotImplementedError:
+        return await loop.create_datagram_endpoint(lambda: protocol, sock=sock)
+
+
+class SharedRiverProtocol(asyncio.DatagramProtocol):
+    """
+    Endpoint UDP de um rio compartilhado por vários jogos do mesmo processo.
+
+    Cada jogo recebe um canal (um RiverProtocol sobre o mesmo transport), e cada
+    datagrama é entregue ao canal do GAS indicado no campo "auth" da resposta.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self._channels = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def channel(self, gas):
+        """
+        Cria o canal do GAS informado (cada GAS só pode ter um canal por endpoint).
+        """
+        if gas in self._channels:
+            raise ValueError(f"GAS {gas} já está em jogo neste endpoint")
+        channel = RiverProtocol()
+        channel.connection_made(self.transport)
+        self._channels[gas] = channel
+        return channel
+
+    def release(self, gas):
+        self._channels.pop(gas, None)
+
+    def datagram_received(self, data, addr):
+        try:
+            message = decodeMessage(data)
+            gas = message["auth"]
+        except (ValueError, KeyError, TypeError):
+            return
+        channel = self._channels.get(gas)
+        # Respostas de jogos que já terminaram são descartadas
+        if channel is not None:
+            channel.deliver(message, data)
+
+    def error_received(self, exc):
+        # Não se sabe de qual jogo era o datagrama que gerou o erro
+        for channel in self._channels.values():
+            channel.error_received(exc)
+
+
+class EndpointPool:
+    """
+    Endpoints UDP compartilhados pelos jogos de um processo: um socket conectado por
+    destino (família, endereço e porta), multiplexado entre os GAS pelo campo "auth".
+    """
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = asyncio.Lock()
+
+    async def channel(self, family, ipAddress, port, gas):
+        """
+        Retorna o canal do GAS no endpoint do destino, criando o endpoint se preciso.
+        """
+        key = (family, ipAddress, port)
+        async with self._lock:
+            endpoint = self._endpoints.get(key)
+            if endpoint is None:
+                client_socket = socket.socket(family, socket.SOCK_DGRAM)
+                try:
+                    client_socket.connect((ipAddress, port))
+                except OSError:
+                    client_socket.close()
+                    raise
+                _, endpoint = await openDatagramEndpoint(
+                    SharedRiverProtocol, client_socket
+                )
+                self._endpoints[key] = endpoint
+        return endpoint.channel(gas)
+
+    def release(self, gas):
+        """
+        Remove os canais do GAS (os endpoints continuam abertos para os outros jogos).
+        """
+        for endpoint in self._endpoints.values():
+            endpoint.release(gas)
+
+    def close(self):
+        for endpoint in self._endpoints.values():
+            endpoint.transport.close()
+        self._endpoints = {}
+
+
+class AddressPath:
+    """
+    Caminho até os quatro servidores por uma família de endereços (IPv4 ou IPv6): um
+    socket conectado e um endpoint por rio, o estimador de RTT de cada rio e a taxa de
+    perda observada nesse caminho.
+    """
+
+    def __init__(self, family, ipAddress):
+        self.family = family
+        self.ipAddress = ipAddress
+        self.sockets = []
+        self.rivers = []
+        self.rttEstimators = [RttEstimator() for _ in range(4)]
+        # Quantidade de cópias de cada requisição por rio (modo hedging)
+        self.redundancy = [RedundancyController() for _ in range(4)]
+        # Fração (média móvel) dos envios que terminaram em timeout. Começa pessimista,
+        # então um caminho com poucos envios observados não parece sem perda
+        self.lossRate = 1.0
+        # Envios observados desde que o caminho passou a ser usado
+        self.samples = 0
+
+    @property
+    def name(self):
+        return "IPv6" if self.family == socket.AF_INET6 else "IPv4"
+
+    def recordAttempt(self, river, lost):
+        """
+        Atualiza a taxa de perda com o resultado de um envio ao rio (lost=True em
+        timeout).
+        """
+        self.samples += 1
+        self.lossRate += LOSS_RATE_ALPHA * ((1.0 if lost else 0.0) - self.lossRate)
+        self.redundancy[river].record(lost)
+
+
+class RiverDiff:
+    """
+    Mudanças nos navios de um rio entre dois turnos, retornadas por Board.updateRiver.
+
+    entered, moved e hit são slots do tabuleiro (navios que entraram no rio, mudaram
+    de ponte e receberam tiros segundo o servidor). disappeared tem tuplas (id, ponte,
+    tiros que faltavam) dos navios que saíram do rio, e mismatches tuplas (slot, tiros
+    contados localmente, tiros informados pelo servidor) dos navios em que as contagens
+    não batem.
+    """
+
+    def __init__(self, river):
+        self.river = river
+        self.entered = []
+        self.moved = []
+        self.hit = []
+        self.disappeared = []
+        self.mismatches = []
+
+
+class Board:
+    """
+    Estado dos navios do turno atual em arrays paralelos, um slot por navio.
+
+    Para cada slot são guardados id, casco (como a quantidade de tiros para afundar),
+    tiros recebidos, rio e ponte. O dicionário id -> slot e as listas de slots de
+    cada célula (rio, ponte) permitem consultas e atualizações em O(1), sem cópias.
+    Slots de navios que saem do tabuleiro são reaproveitados.
+
+    Os slots persistem entre os turnos enquanto o navio está no tabuleiro: hits inclui
+    os tiros validados no turno, e reportedHits os tiros informados pelo servidor no
+    último estado recebido.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.lives = array("b")
+        self.hits = array("b")
+        self.reportedHits = array("b")
+        self.rivers = array("b")
+        self.bridges = array("b")
+        self._slots = {}
+        self._freeSlots = []
+        # rivers x bridges (slots dos navios em cada célula)
+        self._cells = [[[] for _ in range(8)] for _ in range(4)]
+        # Células (rio, ponte) que têm pelo menos um navio
+        self._occupied = set()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def slot(self, ship_id):
+        """
+        Retorna o slot do navio com o id informado (ou None se ele não estiver no tabuleiro).
+        """
+        return self._slots.get(ship_id)
+
+    def cell(self, river, bridge):
+        """
+        Retorna os slots dos navios em uma célula (rio e ponte indexados a partir de 0).
+        """
+        return self._cells[river][bridge]
+
+    def occupiedCells(self):
+        """
+        Retorna as células (rio, ponte) com navios, em ordem de rio e ponte.
+        """
+        return sorted(self._occupied)
+
+    def hull(self, slot):
+        return HULL_NAMES[self.lives[slot]]
+
+    def remaining(self, slot):
+        """
+        Quantidade de tiros que ainda faltam para afundar o navio do slot.
+        """
+        return self.lives[slot] - self.hits[slot]
+
+    def updateRiver(self, river, states):
+        """
+        Atualiza, no próprio tabuleiro, os navios de um rio a partir das oito
+        mensagens "state" do turno. Navios que não aparecem mais no rio são removidos.
+
+        Retorna um RiverDiff com as mudanças em relação ao turno anterior. Os tiros
+        informados pelo servidor sempre prevalecem sobre a contagem local.
+        """
+        diff = RiverDiff(river)
+        previous = set()
+        for bridge, cell in enumerate(self._cells[river]):
+            # A maior parte das células está vazia a cada turno
+            if cell:
+                previous.update(cell)
+                cell.clear()
+                self._occupied.discard((river, bridge))
+
+        for state in states:
+            ships = state["ships"]
+            if not ships:
+                continue
+            bridge = state["bridge"] - 1
+            cell = self._cells[river][bridge]
+            for ship in ships:
+                slot = self._slots.get(ship["id"])
+                hits = ship["hits"]
+                if slot is None:
+                    slot = self._allocate(ship["id"], HULL_LIFE[ship["hull"]])
+                    diff.entered.append(slot)
+                else:
+                    previous.discard(slot)
+                    if self.bridges[slot] != bridge:
+                        diff.moved.append(slot)
+                    if hits > self.reportedHits[slot]:
+                        diff.hit.append(slot)
+                    if hits != self.hits[slot]:
+                        diff.mismatches.append((slot, self.hits[slot], hits))
+                self.hits[slot] = hits
+                self.reportedHits[slot] = hits
+                self.rivers[slot] = river
+                self.bridges[slot] = bridge
+                cell.append(slot)
+                self._occupied.add((river, bridge))
+
+        for slot in previous:
+            diff.disappeared.append(
+                (self.ids[slot], self.bridges[slot], max(self.remaining(slot), 0))
+            )
+            self._release(slot)
+        return diff
+
+    def _allocate(self, ship_id, life):
+        if self._freeSlots:
+            slot = self._freeSlots.pop()
+            self.ids[slot] = ship_id
+            self.lives[slot] = life
+        else:
+            slot = len(self.ids)
+            self.ids.append(ship_id)
+            self.lives.append(life)
+            self.hits.append(0)
+            self.reportedHits.append(0)
+            self.rivers.append(0)
+            self.bridges.append(0)
+        self._slots[ship_id] = slot
+        return slot
+
+    def _release(self, slot):
+        del self._slots[self.ids[slot]]
+        self._freeSlots.append(slot)
+
+
+def cannonCoverage(cannon):
+    """
+    Retorna as células (rio, ponte), indexadas a partir de 0, ao alcance de um canhão.
+
+    O canhão [x, y] fica na ponte x, entre os rios y e y + 1 (numerados a partir de 1),
+    então só alcança os rios que existem dentre esses dois.
+    """
+    bridge = cannon[0] - 1
+    return [(river, bridge) for river in (cannon[1] - 1, cannon[1]) if 0 <= river < 4]
+
+
+class CoverageIndex:
+    """
+    Índice de alcance dos canhões, construído uma única vez quando os canhões são
+    recebidos (eles não mudam de posição durante o jogo).
+
+    Guarda as células (rio, ponte) ao alcance de cada canhão e, no sentido inverso,
+    os canhões que alcançam cada célula.
+    """
+
+    def __init__(self, cannons):
+        self.cannons = [list(cannon) for cannon in cannons]
+        self._cannonCells = [cannonCoverage(cannon) for cannon in self.cannons]
+        self._cannonRivers = [
+            sorted({river for river, _ in cells}) for cells in self._cannonCells
+        ]
+        # rivers x bridges (índices dos canhões que alcançam cada célula)
+        self._cellCannons = [[[] for _ in range(8)] for _ in range(4)]
+        for k, cells in enumerate(self._cannonCells):
+            for river, bridge in cells:
+                self._cellCannons[river][bridge].append(k)
+
+    def __len__(self):
+        return len(self.cannons)
+
+    def cells(self, k):
+        """
+        Células (rio, ponte) ao alcance do k-ésimo canhão.
+        """
+        return self._cannonCells[k]
+
+    def rivers(self, k):
+        """
+        Rios ao alcance do k-ésimo canhão (um ou dois).
+        """
+        return self._cannonRivers[k]
+
+    def subset(self, indices):
+        """
+        Índice de alcance só com os canhões informados (na mesma ordem).
+        """
+        return CoverageIndex([self.cannons[k] for k in indices])
+
+    def cannonsAt(self, river, bridge):
+        """
+        Índices dos canhões que alcançam a célula (rio, ponte).
+        """
+        return self._cellCannons[river][bridge]
+
+
+def greedyTargeting(coverage, board):
+    """
+    Estratégia gulosa: cada canhão, na ordem, atira no navio ao alcance que precisa
+    de menos tiros para afundar, considerando os tiros já planejados pelos anteriores.
+
+    Recebe o índice de alcance dos canhões (CoverageIndex) e o tabuleiro (Board), e
+    retorna uma lista de tuplas (rio, canhão, slot do navio). Não altera o tabuleiro.
+    """
+    plannedHits = {}
+    shots = []
+    for k, cannon in enumerate(coverage.cannons):
+        chosen = None
+        hits_to_sink_previous = 999
+        for river, bridge in coverage.cells(k):
+            for slot in board.cell(river, bridge):
+                # Calcula quantos tiros o navio ainda precisa para afundar
+                hits_to_sink = board.remaining(slot) - plannedHits.get(slot, 0)
+
+                # Escolhe o navio que precisa de menos tiros para afundar
+                if 0 < hits_to_sink < hits_to_sink_previous:
+                    chosen = (river, slot)
+                    hits_to_sink_previous = hits_to_sink
+
+        if chosen is not None:
+            river, slot = chosen
+            plannedHits[slot] = plannedHits.get(slot, 0) + 1
+            shots.append((river, cannon, slot))
+    return shots
+
+
+def _cellPlan(board, cellSlots, bridge, maxShots):
+    """
+    Calcula o melhor uso de 0..maxShots tiros em uma única célula (rio, ponte).
+
+    Como todos os navios da célula são alcançados pelos mesmos canhões, o ótimo é
+    afundar primeiro os que precisam de menos tiros e só então causar dano nos demais.
+    Retorna (valores, alvos), onde valores[n] é o valor de n tiros e alvos é a ordem
+    dos slots que recebem cada tiro.
+    """
+    alive = [slot for slot in cellSlots if board.remaining(slot) > 0]
+    alive.sort(key=lambda slot: (board.remaining(slot), board.ids[slot]))
+
+    targets = []
+    values = [0.0]
+    for slot in alive:
+        remaining = board.remaining(slot)
+        for hit in range(remaining):
+            if len(targets) == maxShots:
+                return values, targets
+            targets.append(slot)
+            value = values[-1] + HIT_VALUE + bridge * BRIDGE_VALUE
+            if hit == remaining - 1:
+                value += SINK_VALUE
+            values.append(value)
+    return values, targets
+
+
+def optimalTargeting(coverage, board):
+    """
+    Estratégia ótima: distribui os canhões do turno entre os navios maximizando, nessa
+    ordem, os navios afundados, o dano causado (sem tiros desperdiçados) e a proximidade
+    dos navios alvo do fim do rio.
+
+    Cada canhão alcança no máximo duas células, e dentro de uma célula a distribuição
+    ótima é conhecida (_cellPlan). Então basta escolher a célula de cada canhão: os que
+    só alcançam uma célula ocupada são fixos, e os demais (no máximo oito) são decididos
+    por uma busca exaustiva, que custa no máximo algumas centenas de passos por turno.
+
+    Mesma interface de greedyTargeting.
+    """
+    # Células ocupadas ao alcance de cada canhão (percorre só as células ocupadas)
+    cannons = coverage.cannons
+    options = [[] for _ in cannons]
+    coveringCannons = {}
+    for cell in board.occupiedCells():
+        cellCannons = coverage.cannonsAt(*cell)
+        if not cellCannons or not any(
+            board.remaining(slot) > 0 for slot in board.cell(*cell)
+        ):
+            continue
+        coveringCannons[cell] = len(cellCannons)
+        for k in cellCannons:
+            options[k].append(cell)
+
+    plans = {
+        cell: _cellPlan(board, board.cell(*cell), cell[1], maxShots)
+        for cell, maxShots in coveringCannons.items()
+    }
+
+    # Canhões com uma única opção são fixos; os demais são decididos pela busca
+    counts = dict.fromkeys(plans, 0)
+    assignment = [cells[0] if len(cells) == 1 else None for cells in options]
+    for cell in assignment:
+        if cell is not None:
+            counts[cell] += 1
+    flexible = [k for k, cells in enumerate(options) if len(cells) == 2]
+
+    best = {"value": -1.0, "choice": []}
+
+    def gain(cell):
+        values = plans[cell][0]
+        n = counts[cell]
+        return values[n + 1] - values[n] if n + 1 < len(values) else 0.0
+
+    def search(depth, value, choice):
+        if depth == len(flexible):
+            if value > best["value"]:
+                best["value"] = value
+                best["choice"] = list(choice)
+            return
+        for cell in options[flexible[depth]]:
+            delta = gain(cell)
+            counts[cell] += 1
+            choice.append(cell)
+            search(depth + 1, value + delta, choice)
+            choice.pop()
+            counts[cell] -= 1
+
+    search(0, 0.0, [])
+    for k, cell in zip(flexible, best["choice"]):
+        assignment[k] = cell
+
+    # Distribui os tiros de cada célula entre os canhões designados para ela
+    shotsPerCell = {cell: 0 for cell in plans}
+    shots = []
+    for cannon, cell in zip(cannons, assignment):
+        if cell is None:
+            continue
+        targets = plans[cell][1]
+        if shotsPerCell[cell] < len(targets):
+            shots.append((cell[0], cannon, targets[shotsPerCell[cell]]))
+            shotsPerCell[cell] += 1
+    return shots
 
 
 class BridgeDefense:
-    def __init__(self, hostname, port1, gas):
+    def __init__(
+        self,
+        hostname,
+        port1,
+        gas,
+        targeting=optimalTargeting,
+        metrics=None,
+        metricsExporter=None,
+        endpointPool=None,
+        recorder=None,
+        replay=None,
+        hedging=False,
+        budgets=None,
+    ):
         self._hostname = hostname
         self._port1 = port1
         self._gas = gas
+        # Mensagens do GAS pré-codificadas em bytes
+        self._codec = MessageCodec(gas)
         self._currentTurn = 0
-        # rivers x bridges
-        self._ships = [
-            [[], [], [], [], [], [], [], []],
-            [[], [], [], [], [], [], [], []],
-            [[], [], [], [], [], [], [], []],
-            [[], [], [], [], [], [], [], []],
-        ]
+        # Navios do turno atual (rios x pontes)
+        self._board = Board()
         self._cannons = []
+        # Alcance dos canhões, construído quando os canhões são recebidos
+        self._coverage = CoverageIndex([])
         self._finished = False
+        # Caminhos até os servidores, um por família de endereços (IPv6 primeiro). Cada
+        # um tem um socket UDP conectado por rio (porta), reutilizado durante todo o jogo
+        self._paths = []
+        # Caminho em uso (o que venceu a corrida de autenticação)
+        self._path = None
+        # Estratégia que escolhe os alvos de cada turno (greedyTargeting ou optimalTargeting)
+        self._targeting = targeting
+        # Métricas do jogo (e, opcionalmente, quem as escreve periodicamente em arquivo)
+        self._metrics = metrics if metrics is not None else Metrics()
+        self._metricsExporter = metricsExporter
+        # Garante um único leitor por vez das respostas de tiro de cada rio
+        self._riverLocks = [asyncio.Lock() for _ in range(4)]
+        # Rios (caminho, rio) já autenticados, na ordem em que a autenticação terminou
+        self._authenticatedRivers = asyncio.Queue()
+        # Endpoints compartilhados com outros jogos do processo (None: sockets próprios)
+        self._endpointPool = endpointPool
+        # Gravação dos datagramas (DatagramRecorder) e reprodução sem rede (DatagramReplay)
+        self._recorder = recorder
+        self._replay = replay
+        # Envia cópias redundantes de getturn em rios com perda (ver _transmit)
+        self._hedging = hedging
+        # Tempo máximo de cada fase (DEFAULT_BUDGETS, com os valores informados por cima)
+        self._budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        # Turnos seguidos em que nenhum rio respondeu ao getturn
+        self._silentTurns = 0
 
     def __del__(self):
-        if not self._finished:
-            self._gameTerminationRequest()
+        self._closeSockets()
 
-    def _get_ip_address(self):
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def _resolveAddresses(self):
         """
-        Obtém endereço a partir de um hostname (escolhe preferencialmente IPv6).
+        Obtém os endereços do hostname, um por família: IPv6 primeiro e depois IPv4,
+        na ordem de preferência usada na corrida de autenticação (RFC 8305).
+
+        Lança socket.gaierror se o hostname não puder ser resolvido.
         """
-        try:
-            # Obtém informações de endereço(s) para esse hostname (usando UDP)
-            addr_info = socket.getaddrinfo(
-                self._hostname, self._port1, 0, socket.SOCK_DGRAM
-            )
+        # Obtém informações de endereço(s) para esse hostname (usando UDP)
+        addr_info = socket.getaddrinfo(
+            self._hostname, self._port1, 0, socket.SOCK_DGRAM
+        )
 
-            # Itera sobre as informações
+        paths = []
+        for wanted in (socket.AF_INET6, socket.AF_INET):
+            # Fica com o primeiro endereço de cada família
             for family, _, _, _, sockaddr in addr_info:
-                ip_address = sockaddr[0]
-                # Escolhe endereço IPv6 se estiver disponível
-                if family == socket.AF_INET6:
-                    return (ip_address, family)
-            # Se não houver IPv6, escolhe IPv4
-            for family, _, _, _, sockaddr in addr_info:
-                ip_address = sockaddr[0]
-                if family == socket.AF_INET:
-                    return (ip_address, family)
-        except socket.gaierror as e:
-            print("Error:", e)
-            sys.exit(1)
+                if family == wanted:
+                    paths.append(AddressPath(family, sockaddr[0]))
+                    break
+        return paths
+
+    def _openSockets(self):
+        """
+        Resolve o hostname uma única vez e abre, para cada família de endereços, um
+        socket UDP conectado para cada rio (porta), que é reaproveitado em todas as
+        requisições e retransmissões. Famílias sem rota nesta máquina são descartadas.
+        """
+        for path in self._resolveAddresses():
+            try:
+                for i in range(4):
+                    client_socket = socket.socket(path.family, socket.SOCK_DGRAM)
+                    path.sockets.append(client_socket)
+                    # connect() fixa o destino e faz o kernel descartar datagramas de outras origens
+                    client_socket.connect((path.ipAddress, self._port1 + i))
+            except OSError as e:
+                logger.warning("Endereço %s indisponível: %s", path.ipAddress, e)
+                for client_socket in path.sockets:
+                    client_socket.close()
+                continue
+            self._paths.append(path)
+
+        if not self._paths:
+            raise OSError(f"nenhum endereço de {self._hostname} está acessível")
+
+    async def _openPooledEndpoints(self):
+        """
+        Obtém do EndpointPool um canal por rio em cada família de endereços, em vez de
+        abrir sockets próprios.
+        """
+        for path in self._resolveAddresses():
+            try:
+                for i in range(4):
+                    path.rivers.append(
+                        await self._endpointPool.channel(
+                            path.family, path.ipAddress, self._port1 + i, self._gas
+                        )
+                    )
+            except OSError as e:
+                logger.warning("Endereço %s indisponível: %s", path.ipAddress, e)
+                continue
+            self._paths.append(path)
+
+        if not self._paths:
+            raise OSError(f"nenhum endereço de {self._hostname} está acessível")
+
+    async def _openEndpoints(self):
+        """
+        Cria um endpoint asyncio (RiverProtocol) sobre o socket de cada rio, em todas
+        as famílias de endereços (ou usa os canais do EndpointPool, se houver um).
+
+        Deve ser chamado uma única vez, antes de qualquer comunicação com os servidores.
+        Lança OSError se nenhum endereço do hostname estiver acessível.
+        """
+        if self._replay is not None:
+            self._paths = self._replay.openPaths()
+            if not self._paths:
+                raise OSError("a gravação não tem nenhum datagrama")
+        elif self._endpointPool is not None:
+            await self._openPooledEndpoints()
+        else:
+            if not self._paths:
+                self._openSockets()
+            for path in self._paths:
+                for client_socket in path.sockets:
+                    _, river = await openDatagramEndpoint(RiverProtocol, client_socket)
+                    path.rivers.append(river)
+        if self._recorder is not None:
+            for path in self._paths:
+                for i, river in enumerate(path.rivers):
+                    river.recorder = self._recorder
+                    river.recordKey = (familyCode(path.family), i)
+        # Até a corrida de autenticação terminar, a família preferida é a atual
+        self._path = self._paths[0]
+
+    def _closeSockets(self):
+        if self._endpointPool is not None:
+            # Os endpoints são de todos os jogos do processo: só os canais são liberados
+            self._endpointPool.release(self._gas)
+            self._paths = []
+            self._path = None
+            return
+        # Fechar o transport também fecha o socket associado
+        for path in self._paths:
+            for river in path.rivers:
+                river.transport.close()
+            for client_socket in path.sockets:
+                client_socket.close()
+        self._paths = []
+        self._path = None
 
-    def _serverCommunication(self, jsonRequest, serverNum, turnRequest=False):
+    async def _serverCommunication(
+        self, requestType, message, serverNum, turn=None, path=None, deadline=None
+    ):
         """
         Administra a comunicação com o servidor.
 
-        Envia um JSON e recebe outro (se for mensagem de erro chama uma exceção e retorna None).
+        Envia a mensagem (já codificada pelo MessageCodec) e retorna a resposta como
+        dicionário; para getturn (turn informado), retorna a lista dos oito estados do
+        rio. Se a resposta for uma mensagem de game over lança GameOver.
 
-        Todos os métodos comunicantes com o servidor devem usá-lo.
+        Todos os métodos comunicantes com o servidor devem usá-lo. Cada rio deve ter
+        no máximo uma requisição pendente por vez, já que as respostas são lidas em ordem
+        da fila do endpoint. Sem path, usa o caminho (família de endereços) atual.
 
-        Obs.: O JSON informado deve estar no formato de string.
+        As retransmissões continuam até a resposta chegar ou até o prazo deadline
+        (time.monotonic), quando é lançado DeadlineExceeded.
         """
-        # Obtém endereço e família (IPv4 ou IPv6)
-        ip_address, address_family = self._get_ip_address()
+        if path is None:
+            path = self._path
+        river = path.rivers[serverNum]
+        self._dropReplies(serverNum, "stale", river.discardPending())
 
-        while True:
-            try:
-                # Cria um socket UDP (e fecha a conexão automaticamente após as operações)
-                with socket.socket(address_family, socket.SOCK_DGRAM) as client_socket:
-                    # configura um timeout para não esperar indefinidamente
-                    client_socket.settimeout(0.4)
-
-                    # Transforma e envia a mensagem para o servidor (para a porta indicada nos parâmetros)
-                    client_socket.sendto(
-                        jsonRequest.encode(), (ip_address, self._port1 + serverNum)
-                    )
+        # Respostas atrasadas de outro tipo (ex.: um shotresp retransmitido) são ignoradas
+        expectedType = RESPONSE_TYPES[requestType]
+        turnRequest = requestType == "getturn"
 
-                    if turnRequest:
-                        responses = []
-
-                        for _ in range(8):
-                            response, _ = client_socket.recvfrom(2048)
-                            response = response.decode()
-                            dictResponse = json.loads(response)
-                            if (
-                                dictResponse["type"] == "gameover"
-                                and dictResponse["status"] == 1
-                            ):
-                                print("JOGO ENCERRADO: " + dictResponse["description"])
-                                self._finished = True
-                                sys.exit(1)
-                            elif (
-                                dictResponse["type"] == "gameover"
-                                and dictResponse["status"] == 0
-                            ):
-                                print("JOGO FINALIZADO.")
-                                print(f"SCORE: {dictResponse['score']}")
-                                self._gameTerminationRequest()
-                                self._finished = True
-                                sys.exit(0)
-                            responses.append(dictResponse)
-
-                        return responses
-                    else:
-                        # Recebe a resposta (com um tamanho máximo) e converte para JSON
-                        response, _ = client_socket.recvfrom(2048)
+        rtt = path.rttEstimators[serverNum]
+        retransmitted = False
+        metrics = self._metrics
+        startedAt = time.monotonic()
 
-                        # Decodifica os bits da resposta do servidor
-                        response = response.decode()
+        # Estados do getturn já recebidos, indexados pela ponte. São mantidos entre
+        # retransmissões, então só é preciso esperar pelas pontes que ainda faltam.
+        bridgeStates = {}
 
-                        # Verifica o tipo da mensagem para saber se é um game over ou não
-                        dictResponse = json.loads(response)
+        def outstanding():
+            # Cópias agendadas pelo hedging deixam de ser enviadas após a resposta
+            if turnRequest and len(bridgeStates) == 8:
+                return ()
+            return (message,)
+
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded(REQUEST_PHASES[requestType])
+            # Estados já recebidos antes desta tentativa (para saber se ela trouxe algo novo)
+            receivedBefore = len(bridgeStates)
+            try:
+                # Envia a mensagem para o servidor do rio indicado nos parâmetros
+                sentAt = time.monotonic()
+                hedge = self._transmit(path, serverNum, requestType, outstanding)
+                timeout = boundedTimeout(rtt.timeout, deadline)
+
+                if turnRequest:
+                    while len(bridgeStates) < 8:
+                        dictResponse = await self._awaitReply(
+                            river, expectedType, serverNum, timeout, hedge
+                        )
+                        # Estados de outro turno (respostas atrasadas) são ignorados
+                        if dictResponse.get("turn", turn) != turn:
+                            self._dropReplies(serverNum, "turn")
+                            continue
+                        bridge = dictResponse.get("bridge")
+                        ships = dictResponse.get("ships")
                         if (
-                            dictResponse["type"] == "gameover"
-                            and dictResponse["status"] == 1
+                            not isinstance(bridge, int)
+                            or bridge not in BRIDGE_NUMBERS
+                            or not isinstance(ships, list)
+                            or not all(validShip(ship) for ship in ships)
                         ):
-                            print("JOGO ENCERRADO: " + dictResponse["description"])
-                            self._finished = True
-                            sys.exit(1)
-                        elif (
-                            dictResponse["type"] == "gameover"
-                            and dictResponse["status"] == 0
-                        ):
-                            print("JOGO FINALIZADO.")
-                            print(f"SCORE: {dictResponse['score']}")
-                            self._gameTerminationRequest()
-                            self._finished = True
-                            sys.exit(0)
-
-                        # Se tudo ocorrer bem, retorna o JSON da resposta
-                        return response
-
-            except socket.timeout:
-                print(
-                    f"Ocorreu um timeout ao tentar conexão com o servidor {serverNum}. Tentando novamente..."
+                            self._dropReplies(serverNum, "invalid")
+                            continue
+                        # As respostas podem chegar fora de ordem (ou duplicadas)
+                        if bridge in bridgeStates:
+                            self._dropReplies(serverNum, "duplicate")
+                            continue
+                        # O RTT é medido pela chegada da primeira das oito respostas
+                        # (se nenhuma cópia extra foi enviada por ser lenta)
+                        if not bridgeStates and not retransmitted:
+                            if hedge is None or not hedge.fired:
+                                rtt.sample(time.monotonic() - sentAt)
+                        bridgeStates[bridge] = dictResponse
+                        rtt.progress()
+
+                    path.recordAttempt(serverNum, lost=False)
+                    metrics.observe(
+                        "bridge_defense_request_seconds",
+                        time.monotonic() - startedAt,
+                        river=serverNum,
+                        type=requestType,
+                    )
+                    # Retorna os estados ordenados pela ponte
+                    return [bridgeStates[bridge] for bridge in sorted(bridgeStates)]
+                else:
+                    # Recebe a resposta (esperando no máximo o timeout atual do rio)
+                    response = await self._awaitReply(
+                        river, expectedType, serverNum, timeout, hedge
+                    )
+                    if not retransmitted and (hedge is None or not hedge.fired):
+                        rtt.sample(time.monotonic() - sentAt)
+                    rtt.progress()
+                    path.recordAttempt(serverNum, lost=False)
+                    metrics.observe(
+                        "bridge_defense_request_seconds",
+                        time.monotonic() - startedAt,
+                        river=serverNum,
+                        type=requestType,
+                    )
+
+                    # Se tudo ocorrer bem, retorna a resposta
+                    return response
+
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Ocorreu um timeout ao tentar conexão com o servidor %d. Tentando novamente...",
+                    serverNum,
+                )
+                metrics.increment(
+                    "bridge_defense_timeouts_total", river=serverNum, type=requestType
                 )
+                path.recordAttempt(serverNum, lost=True)
+                # Só recua se a tentativa não trouxe nenhum estado novo
+                if len(bridgeStates) == receivedBefore:
+                    rtt.backoff()
+                retransmitted = True
             except socket.error as e:
-                print("An error occurred. Retrying... Socket error:", e)
+                logger.warning("An error occurred. Retrying... Socket error: %s", e)
+                metrics.increment(
+                    "bridge_defense_socket_errors_total",
+                    river=serverNum,
+                    type=requestType,
+                )
+                path.recordAttempt(serverNum, lost=True)
+                # Um erro ICMP chega na hora: espera como num timeout antes de reenviar,
+                # para não ficar reenviando sem parar por um caminho inacessível
+                await asyncio.sleep(boundedTimeout(rtt.timeout, deadline))
+                rtt.backoff()
+                retransmitted = True
 
-        # Se nenhum erro ocorrer, converte a resposta para JSON
+    def _transmit(self, path, serverNum, requestType, outstanding):
+        """
+        Envia ao rio as mensagens retornadas por outstanding() (as que ainda esperam
+        resposta).
 
-    def _authenticationRequest(self):
+        No modo hedging, os tipos de HEDGED_TYPES são enviados em
+        path.redundancy[serverNum].copies cópias espaçadas de HEDGE_STAGGER, e é retornado
+        um Hedge que envia mais uma cópia se a resposta passar do percentil de latência do
+        rio. Sem hedging (ou para os demais tipos) retorna None.
         """
-        Recebe um GAS, envia para o servidor, que retorna autenticação.
+        river = path.rivers[serverNum]
+        for message in outstanding():
+            river.send(message)
+        if not self._hedging or requestType not in HEDGED_TYPES:
+            return None
+
+        def resend(kind):
+            # O jogo pode ter terminado antes de uma cópia agendada
+            if self._finished:
+                return
+            for message in list(outstanding()):
+                river.send(message)
+                self._metrics.increment(
+                    "bridge_defense_hedges_total",
+                    river=serverNum,
+                    type=requestType,
+                    kind=kind,
+                )
+
+        loop = asyncio.get_running_loop()
+        for copy in range(1, path.redundancy[serverNum].copies):
+            loop.call_later(HEDGE_STAGGER * copy, resend, "copy")
+        return Hedge(
+            time.monotonic() + path.rttEstimators[serverNum].hedgeDelay, resend
+        )
+
+    async def _awaitReply(self, river, expectedType, serverNum, timeout, hedge):
         """
+        Como _receiveResponse, mas espera no máximo timeout segundos (lança
+        asyncio.TimeoutError). Se o instante do Hedge passar antes da resposta, a cópia
+        extra é enviada (uma única vez) e a espera continua até o timeout.
+        """
+        receive = self._receiveResponse(river, expectedType, serverNum)
+        if hedge is None or hedge.fired:
+            return await asyncio.wait_for(receive, timeout)
 
-        # Transforma os dados necessários para esse tipo de requisição em um JSON
-        jsonMessage = json.dumps({"type": "authreq", "auth": self._gas})
+        deadline = time.monotonic() + timeout
+        receiving = asyncio.ensure_future(receive)
+        try:
+            while True:
+                now = time.monotonic()
+                if not hedge.fired and now >= hedge.at:
+                    hedge.fire()
+                wakeAt = deadline if hedge.fired else min(deadline, hedge.at)
+                done, _ = await asyncio.wait((receiving,), timeout=max(wakeAt - now, 0))
+                if done:
+                    return receiving.result()
+                if time.monotonic() >= deadline:
+                    raise asyncio.TimeoutError()
+        finally:
+            receiving.cancel()
 
-        # Faz a autenticação nos quatro servidores (rios)
-        successfulAuthentication = [False for i in range(4)]
+    async def _receiveResponse(self, river, expectedType, serverNum):
+        """
+        Aguarda a próxima resposta do tipo esperado no endpoint do rio e a retorna
+        (já decodificada pelo endpoint). Respostas de outro GAS ou de outros tipos são
+        descartadas e contadas.
+        """
+        while True:
+            dictResponse = await river.receive()
+            if not isinstance(dictResponse, dict):
+                self._dropReplies(serverNum, "invalid")
+                continue
+            if dictResponse.get("auth", self._gas) != self._gas:
+                self._dropReplies(serverNum, "auth")
+                continue
+            # Respostas sem os campos que serão lidos (ex.: game over sem status)
+            if not validReply(dictResponse):
+                self._dropReplies(serverNum, "invalid")
+                continue
+            # Verifica o tipo da mensagem para saber se é um game over ou não
+            self._checkGameOver(dictResponse)
+            if dictResponse.get("type") == expectedType:
+                return dictResponse
+            self._dropReplies(serverNum, "type")
+
+    def _dropReplies(self, serverNum, reason, count=1):
+        """
+        Conta respostas descartadas do rio (atrasadas, duplicadas ou inválidas).
+        """
+        if count:
+            self._metrics.increment(
+                "bridge_defense_dropped_replies_total",
+                count,
+                river=serverNum,
+                reason=reason,
+            )
+
+    def _deadline(self, phase, start=None):
+        """
+        Prazo (time.monotonic) da fase começando em start (agora, por padrão), ou None
+        se a fase não tem limite.
+        """
+        budget = self._budgets.get(phase)
+        if budget is None:
+            return None
+        return (time.monotonic() if start is None else start) + budget
+
+    def _budgetExhausted(self, phase, action, count=1):
+        self._metrics.increment(
+            "bridge_defense_budget_exhausted_total", count, phase=phase, action=action
+        )
 
-        def authenticate(i):
+    async def _shotRequests(self, shots, deadline=None):
+        """
+        Envia de uma só vez todos os tiros do turno, recebendo uma lista de tuplas
+        (rio, canhão, id do navio).
+
+        Os tiros de cada rio são enviados juntos pelo socket desse rio, e cada resposta
+        é associada ao seu tiro pelo par (canhão, id). Após um timeout somente os tiros
+        ainda sem resposta são retransmitidos, até o prazo deadline (time.monotonic):
+        depois dele os tiros sem resposta são abandonados.
+
+        Retorna um dicionário (canhão, id) -> resposta do servidor (só dos tiros que
+        foram respondidos) e o conjunto dos pares (canhão, id) enviados mais de uma vez,
+        cuja resposta pode ser a de uma cópia posterior ao tiro que acertou.
+        """
+        shotsPerRiver = [[] for _ in range(4)]
+        for river, cannon, ship_id in shots:
+            shotsPerRiver[river].append((cannon, ship_id))
+
+        results = {}
+        resent = set()
+
+        async def dispatch(i):
+            pending = {}
+            for cannon, ship_id in shotsPerRiver[i]:
+                pending[(tuple(cannon), ship_id)] = self._codec.shot(cannon, ship_id)
+            if not pending:
+                return
+
+            # Grupos de tiros do mesmo turno podem ser enviados ao mesmo tempo (ver
+            # _playTurn), mas só um deles lê as respostas do rio por vez
+            async with self._riverLocks[i]:
+                path = self._path
+                river = path.rivers[i]
+                self._dropReplies(i, "stale", river.discardPending())
+                rtt = path.rttEstimators[i]
+                retransmitted = False
+                sampled = False
+                metrics = self._metrics
+                startedAt = time.monotonic()
+
+                while pending:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self._budgetExhausted("turn", "skip_shots", len(pending))
+                        logger.warning(
+                            "%d tiros no rio %d sem resposta até o fim do turno",
+                            len(pending),
+                            i,
+                        )
+                        return
+                    # Tiros pendentes antes desta tentativa
+                    pendingBefore = len(pending)
+                    try:
+                        # (Re)envia todos os tiros do rio que ainda não foram confirmados
+                        sentAt = time.monotonic()
+                        metrics.increment(
+                            "bridge_defense_shots_sent_total", len(pending), river=i
+                        )
+                        if retransmitted:
+                            resent.update(pending)
+                        for message in pending.values():
+                            river.send(message)
+                        timeout = boundedTimeout(rtt.timeout, deadline)
+
+                        while pending:
+                            dictResponse = await self._awaitReply(
+                                river, "shotresp", i, timeout, None
+                            )
+                            # Os campos já foram verificados em _receiveResponse (validReply)
+                            key = (tuple(dictResponse["cannon"]), dictResponse["id"])
+                            # Respostas duplicadas ou de tiros antigos são ignoradas
+                            if key not in pending:
+                                self._dropReplies(
+                                    i, "duplicate" if key in results else "stale"
+                                )
+                            else:
+                                # O RTT é medido pela primeira resposta da primeira rajada
+                                if not retransmitted and not sampled:
+                                    rtt.sample(time.monotonic() - sentAt)
+                                    sampled = True
+                                rtt.progress()
+                                del pending[key]
+                                results[key] = dictResponse
+                                metrics.increment(
+                                    "bridge_defense_shots_acked_total", river=i
+                                )
+                                metrics.observe(
+                                    "bridge_defense_request_seconds",
+                                    time.monotonic() - startedAt,
+                                    river=i,
+                                    type="shot",
+                                )
+                        path.recordAttempt(i, lost=False)
+                    except asyncio.TimeoutError:
+                        logger.warning(
+                            "Ocorreu um timeout ao tentar conexão com o servidor %d. Tentando novamente...",
+                            i,
+                        )
+                        metrics.increment(
+                            "bridge_defense_timeouts_total", river=i, type="shot"
+                        )
+                        path.recordAttempt(i, lost=True)
+                        # Só recua se a tentativa não trouxe nenhuma confirmação nova
+                        if len(pending) == pendingBefore:
+                            rtt.backoff()
+                        retransmitted = True
+                    except socket.error as e:
+                        logger.warning(
+                            "An error occurred. Retrying... Socket error: %s", e
+                        )
+                        metrics.increment(
+                            "bridge_defense_socket_errors_total", river=i, type="shot"
+                        )
+                        path.recordAttempt(i, lost=True)
+                        await asyncio.sleep(boundedTimeout(rtt.timeout, deadline))
+                        rtt.backoff()
+                        retransmitted = True
+
+        await self._runPerRiver(dispatch)
+        return results, resent
+
+    def _checkGameOver(self, dictResponse):
+        """
+        Lança GameOver se a resposta do servidor indicar o fim do jogo.
+        """
+        if dictResponse.get("type") == "gameover":
+            self._finished = True
+            raise GameOver(dictResponse)
+
+    async def _runPerRiver(self, coroutineFunction):
+        """
+        Executa a corrotina informada para os quatro rios simultaneamente no mesmo
+        event loop. Se alguma delas falhar (por exemplo com GameOver), as demais
+        são canceladas e a exceção é propagada.
+        """
+        tasks = [asyncio.create_task(coroutineFunction(i)) for i in range(4)]
+        try:
+            done, pending = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_EXCEPTION
+            )
+        finally:
+            for task in tasks:
+                task.cancel()
+        for task in tasks:
+            if task in done and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+
+    async def _authenticationRequest(self, path=None, deadline=None):
+        """
+        Recebe um GAS, envia para o servidor, que retorna autenticação.
+
+        Sem path, autentica pelo caminho (família de endereços) atual. Lança
+        DeadlineExceeded se algum rio não responder até o prazo deadline.
+        """
+        if path is None:
+            path = self._path
+
+        # Faz a autenticação nos quatro servidores (rios)
+        async def authenticate(i):
             # Recebe a resposta do servidor e transforma em um dicionário
-            jsonResponse = self._serverCommunication(jsonMessage, i)
-            dictResponse = json.loads(jsonResponse)
+            dictResponse = await self._serverCommunication(
+                "authreq", self._codec.authreq, i, path=path, deadline=deadline
+            )
 
             # Retorna o status da autenticação em cada servidor (rio)
             if dictResponse["status"] == 0:
-                print(f"GAS autenticado no rio {i}")
-                successfulAuthentication[i] = True
-            else:
-                print(f"Não foi possivel autenticar GAS no rio {i}")
-
-        threads = [Thread(target=authenticate, args=(i,)) for i in range(4)]
-
-        for t in threads:
-            t.start()
+                logger.info("GAS autenticado no rio %d (%s)", i, path.name)
+                # O rio já pode receber o pedido de canhões
+                self._authenticatedRivers.put_nowait((path, i))
+                return True
+            logger.warning(
+                "Não foi possivel autenticar GAS no rio %d (%s)", i, path.name
+            )
+            return False
 
-        for t in threads:
-            t.join()
+        successfulAuthentication = await self._runPerRiver(authenticate)
 
         # Retorna True somente se a autenticação for bem sucedida em todos os servidores
         return all(success for success in successfulAuthentication)
 
-    def _cannonPlacementRequest(self):
-        jsonMessage = json.dumps({"type": "getcannons", "auth": self._gas})
+    async def _authenticationRace(self, deadline=None):
+        """
+        Autentica por todas as famílias de endereços ao mesmo tempo (happy eyeballs,
+        RFC 8305): a preferida (IPv6) começa primeiro e cada uma das seguintes só depois
+        de CONNECTION_ATTEMPT_DELAY. A primeira família autenticada nos quatro rios passa
+        a ser usada no jogo e as demais tentativas são canceladas.
 
-        # Todos os servidores respondem igualmente a requisição de canhões
-        jsonResponse = self._serverCommunication(jsonMessage, 0)
-        dictResponse = json.loads(jsonResponse)
+        Retorna True se alguma família conseguiu autenticar.
+        """
+        if len(self._paths) == 1:
+            return await self._authenticationRequest(self._paths[0], deadline)
 
-        self._cannons = dictResponse["cannons"]
+        async def attempt(path, delay):
+            await asyncio.sleep(delay)
+            return await self._authenticationRequest(path, deadline)
 
-    def _turnStateRequest(self):
-        data = {"type": "getturn", "auth": self._gas, "turn": self._currentTurn}
-        jsonMessage = json.dumps(data)
+        tasks = {
+            asyncio.create_task(attempt(path, k * CONNECTION_ATTEMPT_DELAY)): path
+            for k, path in enumerate(self._paths)
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    # GameOver (ou outro erro inesperado) encerra a corrida
+                    if task.exception() is not None:
+                        raise task.exception()
+                    if task.result():
+                        self._path = tasks[task]
+                        # A família vencedora recomeça a contagem de envios observados
+                        self._path.samples = 0
+                        logger.info(
+                            "Usando %s (%s)", self._path.name, self._path.ipAddress
+                        )
+                        return True
+        finally:
+            for task in tasks:
+                task.cancel()
+        return False
 
-        def requestAndUpdateState(i):
-            responses = self._serverCommunication(jsonMessage, i, turnRequest=True)
-            for bridge, response in enumerate(responses):
-                ships = response["ships"]
-                self._ships[i][bridge] = ships
-                # Output dos turnos
-                for ship in ships:
-                    print(f"Navio {ship} no rio {i+1} ponte {bridge+1}.")
+    def _checkAddressFallback(self):
+        """
+        Troca de família de endereços se a perda no caminho atual ficar alta e houver
+        outro caminho com perda menor (a última observada nele). A troca só é avaliada
+        depois de FALLBACK_MIN_SAMPLES envios no caminho atual, o que evita alternar
+        entre as famílias a cada turno.
 
-        threads = [Thread(target=requestAndUpdateState, args=(i,)) for i in range(4)]
+        A perda de cada caminho começa em 100%: uma família cuja autenticação foi
+        cancelada depois de poucas respostas só é escolhida se o caminho atual estiver
+        perdendo ainda mais.
+        """
+        current = self._path
+        if (
+            current.samples < FALLBACK_MIN_SAMPLES
+            or current.lossRate < FALLBACK_LOSS_RATE
+        ):
+            return
+        alternatives = [path for path in self._paths if path is not current]
+        if not alternatives:
+            return
+        best = min(alternatives, key=lambda path: path.lossRate)
+        if best.lossRate >= current.lossRate:
+            return
 
-        for t in threads:
-            t.start()
+        logger.warning(
+            "Perda de %.0f%% em %s: trocando para %s (%s)",
+            100 * current.lossRate,
+            current.name,
+            best.name,
+            best.ipAddress,
+        )
+        self._metrics.increment(
+            "bridge_defense_address_fallbacks_total", family=best.name
+        )
+        best.samples = 0
+        self._path = best
 
-        for t in threads:
-            t.join()
+    async def _cannonPlacementRequest(self, deadline=None):
+        """
+        Pede os canhões a cada rio assim que ele é autenticado (em qualquer família de
+        endereços) e usa a primeira resposta: todos os servidores respondem igualmente,
+        então um rio com perda não atrasa o início do jogo. Os pedidos que ainda não
+        foram respondidos são cancelados.
 
-        self._currentTurn += 1
+        Roda junto com a autenticação, de modo que o alcance dos canhões costuma estar
+        pronto antes de ela terminar. Lança DeadlineExceeded se nenhum rio responder até
+        o prazo deadline.
+        """
+        requests = set()
+        waiting = None
+        try:
+            while True:
+                if waiting is None:
+                    waiting = asyncio.ensure_future(self._authenticatedRivers.get())
+                done, _ = await asyncio.wait(
+                    requests | {waiting},
+                    timeout=boundedTimeout(None, deadline),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    raise DeadlineExceeded("startup")
+                for task in done:
+                    if task is waiting:
+                        path, i = task.result()
+                        waiting = None
+                        requests.add(
+                            asyncio.create_task(
+                                self._serverCommunication(
+                                    "getcannons", self._codec.getcannons, i, path=path
+                                )
+                            )
+                        )
+                    elif task.exception() is not None:
+                        # GameOver (ou outro erro inesperado) encerra o jogo
+                        raise task.exception()
+                    else:
+                        dictResponse = task.result()
+                        self._cannons = dictResponse["cannons"]
+                        self._coverage = CoverageIndex(self._cannons)
+                        return
+        finally:
+            if waiting is not None:
+                waiting.cancel()
+            for task in requests:
+                task.cancel()
 
-    def _shotMessage(self):
+    async def _playTurn(self):
         """
-        Atira nos melhores navios possíveis a partir das insformações
-        das variáveis "_ships" e "_cannons", que representam o turno atual.
-        A solução é especificada na documentação.
-        """
-
-        # ALGORITMO PARA DEFINIR EM QUE NAVIO OS CANHÕES DEVEM ATIRAR
-        for cannon in self._cannons:
-            # Adapta as posições de canhões às coerdenadas de navio
-            coordinate_x = cannon[1] - 1
-            coordinate_y = cannon[0] - 1
-
-            # Obtém todos os navios ao alcance e adiciona em uma lista, e armazena as suas coordenadas
-            ships_lists = self._ships + [[None] * 8]
-            ships_in_range = []
-            for i in range(2):
-                if ships_lists[coordinate_x + i][coordinate_y] is not None:
-                    ships = ships_lists[coordinate_x + i][coordinate_y]
-                    for ship in ships:
-                        ship["x_coordinate"] = coordinate_x + i
-                        ship["y_coordinate"] = coordinate_y
-                    ships_in_range.extend(ships)
-
-            # Calcula quantos tiros cada navio ainda precisa para afundar
-            hits_needed = {"frigate": 1, "destroyer": 2, "battleship": 3}
-            chosen_ship = {}
-            hits_to_sink_previous = 999
-            for ship in ships_in_range:
-                hull = ship["hull"]
-                hits = ship["hits"]
-                hits_to_sink = hits_needed[hull] - hits
+        Joga um turno sem barreira entre o getturn e os tiros.
 
-                # Escolhe o navio que precisa de menos tiros para afundar
-                if hits_to_sink < hits_to_sink_previous and hits < hits_needed[hull]:
-                    chosen_ship = ship
-                    hits_to_sink_previous = hits_to_sink
+        O estado de cada rio é aplicado ao tabuleiro assim que chega. Se todos os rios
+        chegarem dentro do menor timeout atual, os tiros são planejados de uma vez só;
+        depois disso (algum rio está retransmitindo), cada canhão cujos rios já são
+        conhecidos é planejado e atira imediatamente, sem esperar pelos rios atrasados.
+        O turno termina quando todos os tiros foram respondidos.
 
-            # Envia ao servidor a mensagem para atirar no navio escolhido
-            if chosen_ship.get("id") is not None:
-                shot_json_message = {
-                    "type": "shot",
-                    "auth": self._gas,
-                    "cannon": cannon,
-                    "id": chosen_ship["id"],
-                }
-                # Envia a mensagem
-                shot_result = self._serverCommunication(
-                    json.dumps(shot_json_message), chosen_ship["x_coordinate"]
+        O turno tem um prazo (budget "turn") e o getturn outro, dentro dele (budget
+        "getturn"). Um rio sem estado até o prazo do getturn fica de fora do turno (os
+        canhões que dependem dele não atiram), e os tiros sem resposta até o prazo do
+        turno são abandonados. Após MAX_SILENT_TURNS turnos seguidos sem o estado de
+        nenhum rio, lança DeadlineExceeded.
+        """
+        turn = self._currentTurn
+        message = self._codec.getturn(turn)
+        coverage = self._coverage
+        startedAt = time.monotonic()
+        graceDeadline = startedAt + min(rtt.timeout for rtt in self._path.rttEstimators)
+        turnDeadline = self._deadline("turn", startedAt)
+        stateDeadline = earliestDeadline(
+            turnDeadline, self._deadline("getturn", startedAt)
+        )
+
+        async def requestAndUpdateState(i):
+            try:
+                responses = await self._serverCommunication(
+                    "getturn", message, i, turn=turn, deadline=stateDeadline
                 )
-                shot_result = json.loads(shot_result)
-
-                # Interpreta o resultado retornado pelo servidor
-                if shot_result.get("status") == 0:
-                    # Mensagem de sucesso
-                    print(
-                        f"Canhão {shot_result.get('cannon')}"
-                        + f" atirou no navio {shot_result.get('id')} com sucesso!"
-                    )
+            except DeadlineExceeded:
+                # Segue com o estado parcial: o tabuleiro do rio fica com o turno anterior
+                self._budgetExhausted("getturn", "partial_state")
+                logger.warning("Sem o estado do rio %d no turno %d", i, turn)
+                return None
+            # Atualiza o tabuleiro no próprio lugar com os navios do rio
+            self._reportRiverDiff(self._board.updateRiver(i, responses))
+            return i
 
-                    # Atualiza localmente a quantidade de tiros tomados por um navio
-                    x = chosen_ship.get("x_coordinate")
-                    y = chosen_ship.get("y_coordinate")
-                    ship_id = chosen_ship.get("id")
-                    for s in range(len(self._ships[x][y])):
-                        if ship_id == shot_result.get("id") and ship_id == self._ships[
-                            x
-                        ][y][s].get("id"):
-                            self._ships[x][y][s]["hits"] += 1
+        # Na reprodução de uma gravação, os grupos de canhões são os gravados
+        plans = self._replay.plannedGroups(turn) if self._replay is not None else None
 
+        stateTasks = [asyncio.create_task(requestAndUpdateState(i)) for i in range(4)]
+        shotTasks = []
+        ready = [False] * 4
+        unplanned = list(range(len(coverage)))
+        try:
+            pending = set(stateTasks)
+            while pending:
+                now = time.monotonic()
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=(
+                        graceDeadline - now
+                        if plans is None and now < graceDeadline
+                        else None
+                    ),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    # Propaga GameOver (ou outro erro) do getturn
+                    river = task.result()
+                    if river is not None:
+                        ready[river] = True
+                if not pending:
+                    self._metrics.observe(
+                        "bridge_defense_phase_seconds",
+                        time.monotonic() - startedAt,
+                        phase="getturn",
+                    )
+                elif plans is None and time.monotonic() < graceDeadline:
+                    continue
+
+                if plans is None:
+                    # Canhões cujos rios já são conhecidos atiram sem esperar pelos demais
+                    groups = [
+                        [
+                            k
+                            for k in unplanned
+                            if all(ready[river] for river in coverage.rivers(k))
+                        ]
+                    ]
                 else:
-                    # Informa o erro caso o tiro não tenha sido validado (mas o jogo continua normalmente)
-                    print(
-                        f"Canhão {shot_result.get('cannon')}"
-                        + " tentou atirar no navio {shot_result.get('id')}"
-                        + " e não conseguiu: {shot_result.get('description')}"
+                    # Cada grupo gravado atira assim que os seus rios são conhecidos
+                    groups = []
+                    while plans and all(
+                        ready[river] for k in plans[0] for river in coverage.rivers(k)
+                    ):
+                        groups.append(plans.popleft())
+                for cannons in groups:
+                    if not cannons:
+                        continue
+                    if self._recorder is not None:
+                        self._recorder.record(
+                            PLANNED,
+                            PLAN_KEY,
+                            encodeValue({"turn": turn, "cannons": cannons}),
+                        )
+                    if not shotTasks:
+                        logger.info("\n--------- ATIRANDO ---------")
+                    unplanned = [k for k in unplanned if k not in cannons]
+                    if len(cannons) < len(coverage):
+                        group = coverage.subset(cannons)
+                    else:
+                        group = coverage
+                    shotTasks.append(
+                        asyncio.create_task(self._shotMessage(group, turnDeadline))
                     )
 
-    def _gameTerminationRequest(self):
-        jsonMessage = json.dumps({"type": "quit", "auth": self._gas})
+            await asyncio.gather(*shotTasks)
+        finally:
+            for task in stateTasks + shotTasks:
+                task.cancel()
+            # Um game over chega em todos os rios: só o primeiro é propagado, e os demais
+            # são recolhidos aqui para o asyncio não acusar exceções não lidas
+            await asyncio.gather(*stateTasks, *shotTasks, return_exceptions=True)
+
+        if unplanned:
+            logger.warning(
+                "%d canhões sem o estado dos seus rios não atiraram", len(unplanned)
+            )
+        if any(ready):
+            self._silentTurns = 0
+        else:
+            self._silentTurns += 1
+            if self._silentTurns >= MAX_SILENT_TURNS:
+                raise DeadlineExceeded("turn")
+
+        self._currentTurn += 1
+        self._metrics.increment("bridge_defense_turns_total")
+
+    def _reportRiverDiff(self, diff):
+        """
+        Registra as mudanças de um rio no turno: divergências entre os tiros contados
+        localmente e os do servidor (sempre) e os eventos dos navios (no nível DEBUG).
+        """
+        board = self._board
+        river = diff.river + 1
+        for slot, localHits, serverHits in diff.mismatches:
+            self._metrics.increment(
+                "bridge_defense_hit_mismatches_total", river=diff.river
+            )
+            logger.warning(
+                "Navio %d no rio %d: %d tiros contados localmente, %d segundo o servidor",
+                board.ids[slot],
+                river,
+                localHits,
+                serverHits,
+            )
+
+        # Output dos turnos (só formatado se o nível DEBUG estiver ativo)
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        for slot in diff.entered:
+            logger.debug(
+                "Navio %d (%s) entrou no rio %d ponte %d.",
+                board.ids[slot],
+                board.hull(slot),
+                river,
+                board.bridges[slot] + 1,
+            )
+        for slot in diff.hit:
+            logger.debug(
+                "Navio %d no rio %d ponte %d foi atingido (%d/%d).",
+                board.ids[slot],
+                river,
+                board.bridges[slot] + 1,
+                board.hits[slot],
+                board.lives[slot],
+            )
+        if diff.moved:
+            logger.debug("%d navios avançaram no rio %d.", len(diff.moved), river)
+        for ship_id, bridge, remaining in diff.disappeared:
+            if remaining == 0:
+                outcome = "afundado"
+            elif bridge == 7:
+                outcome = "escapou"
+            else:
+                outcome = "desapareceu"
+            logger.debug(
+                "Navio %d saiu do rio %d na ponte %d (%s).",
+                ship_id,
+                river,
+                bridge + 1,
+                outcome,
+            )
+
+    async def _shotMessage(self, coverage=None, deadline=None):
+        """
+        Atira nos melhores navios possíveis a partir das insformações
+        das variáveis "_board" e "_coverage", que representam o turno atual.
+        Os alvos são escolhidos pela estratégia de mira (targeting) do jogo.
+
+        Com coverage, só os canhões desse índice de alcance atiram (os tiros já
+        planejados por outros canhões no turno estão contados no tabuleiro). Tiros sem
+        resposta até o prazo deadline são tratados como não validados.
+        """
+
+        # Escolhe os alvos do turno com a estratégia configurada
+        board = self._board
+        shots = self._targeting(coverage or self._coverage, board)
+
+        # Conta os tiros localmente já no planejamento (são desfeitos se o tiro falhar)
+        for _, _, slot in shots:
+            board.hits[slot] += 1
+
+        # Envia ao servidor todos os tiros do turno de uma só vez
+        results, resent = await self._shotRequests(
+            [(river, cannon, board.ids[slot]) for river, cannon, slot in shots],
+            deadline,
+        )
+
+        for river, cannon, slot in shots:
+            key = (tuple(cannon), board.ids[slot])
+            shot_result = results.get(key)
+            if shot_result is None:
+                # Tiro abandonado no fim do turno: se ele acertou, o próximo estado do
+                # rio corrige a contagem
+                board.hits[slot] -= 1
+                continue
+
+            # Interpreta o resultado retornado pelo servidor
+            if shot_result.get("status") == 0:
+                # Mensagem de sucesso
+                logger.debug(
+                    "Canhão %s atirou no navio %s com sucesso!",
+                    shot_result.get("cannon"),
+                    shot_result.get("id"),
+                )
+            elif key in resent:
+                # A resposta do primeiro envio se perdeu e a recusa é de uma cópia
+                # (ex.: "cannon already shot this turn"): o tiro continua contado, e o
+                # próximo estado do rio corrige a contagem se ele não acertou
+                logger.debug(
+                    "Canhão %s retransmitiu o tiro no navio %s e foi recusado (%s): "
+                    "o tiro é mantido como acerto",
+                    shot_result.get("cannon"),
+                    shot_result.get("id"),
+                    shot_result.get("description"),
+                )
+            else:
+                # Desfaz o tiro contado no planejamento, já que ele não foi validado
+                board.hits[slot] -= 1
+                self._metrics.increment(
+                    "bridge_defense_shots_failed_total", river=river
+                )
+
+                # Informa o erro caso o tiro não tenha sido validado (mas o jogo continua normalmente)
+                logger.info(
+                    "Canhão %s tentou atirar no navio %s e não conseguiu: %s",
+                    shot_result.get("cannon"),
+                    shot_result.get("id"),
+                    shot_result.get("description"),
+                )
+
+    async def _gameTerminationRequest(self):
         # Quit pode ser realizado em um servidor e todos encerrarão o jogo
-        self._serverCommunication(jsonMessage, 0)
+        try:
+            await self._serverCommunication(
+                "quit", self._codec.quit, 0, deadline=self._deadline("quit")
+            )
+        except GameOver as gameOver:
+            # O servidor confirma o quit com um game over
+            if gameOver.description is not None:
+                logger.info("JOGO ENCERRADO: %s", gameOver.description)
+        except DeadlineExceeded:
+            # O servidor pode já ter encerrado o jogo (ou estar inacessível)
+            self._budgetExhausted("quit", "abort")
+            logger.warning("O servidor não confirmou o quit")
+        self._finished = True
 
-    def playGame(self):
+    async def _timedPhase(self, phase, coroutine):
         """
-        Dá início ao jogo.
+        Aguarda a corrotina de uma fase do jogo, registrando quanto tempo ela levou.
         """
-        # ETAPA1: Faz a autenticação nos 4 rios
-        print("--------- INICIANDO AUTENTICAÇÃO ---------")
-        if not self._authenticationRequest():
-            print(
-                "Para continuar é preciso autenticar em todos os rios. Tente novamente."
+        startedAt = time.monotonic()
+        try:
+            return await coroutine
+        finally:
+            self._metrics.observe(
+                "bridge_defense_phase_seconds",
+                time.monotonic() - startedAt,
+                phase=phase,
             )
-            sys.exit(0)
 
-        # Armazena as posições dos canhões
-        print("\n--------- RECEBENDO OS CANHÕES ---------")
-        self._cannonPlacementRequest()
-        print(f"Canhões: {self._cannons}")
+    def _gameResult(self, status, description=None, score=None):
+        """
+        Resultado de um jogo, devolvido por playGameAsync: status 0 indica que o jogo
+        chegou ao fim normalmente (score traz o placar do servidor).
+        """
+        return {
+            "gas": self._gas,
+            "status": status,
+            "description": description,
+            "score": score,
+            "turns": self._currentTurn,
+        }
 
-        # Avança turno e atira nos navios a cada turno (até o fim do jogo)
-        while True:
-            print(f"\n--------- TURNO {self._currentTurn} ---------")
-            self._turnStateRequest()
+    async def playGameAsync(self):
+        """
+        Dá início ao jogo (ponto de entrada assíncrono).
 
-            if self._finished:
-                break
+        Retorna o resultado do jogo (_gameResult) em vez de encerrar o processo, para
+        que vários jogos possam rodar no mesmo processo.
+        """
+        # Abre os endpoints dos quatro rios uma única vez, antes de qualquer requisição
+        try:
+            await self._openEndpoints()
+        except OSError as e:
+            logger.error("Error: %s", e)
+            self._closeSockets()
+            return self._gameResult(1, description=str(e))
+
+        exporterTask = None
+        if self._metricsExporter is not None:
+            exporterTask = asyncio.create_task(self._metricsExporter.run())
+
+        # Os canhões são pedidos a cada rio assim que ele é autenticado
+        startupDeadline = self._deadline("startup")
+        cannonTask = asyncio.create_task(self._cannonPlacementRequest(startupDeadline))
+        try:
+            # ETAPA1: Faz a autenticação nos 4 rios
+            logger.info("--------- INICIANDO AUTENTICAÇÃO ---------")
+            authenticated = await self._timedPhase(
+                "auth", self._authenticationRace(startupDeadline)
+            )
+            if not authenticated:
+                logger.error(
+                    "Para continuar é preciso autenticar em todos os rios. Tente novamente."
+                )
+                return self._gameResult(1, description="authentication failed")
+
+            # Armazena as posições dos canhões
+            logger.info("\n--------- RECEBENDO OS CANHÕES ---------")
+            await self._timedPhase("cannons", cannonTask)
+            logger.info("Canhões: %s", self._cannons)
 
-            print("\n--------- ATIRANDO ---------")
-            self._shotMessage()
+            # Avança turno e atira nos navios a cada turno (até o fim do jogo)
+            while True:
+                logger.info("\n--------- TURNO %d ---------", self._currentTurn)
+                await self._timedPhase("turn", self._playTurn())
 
-        return None
+                # Volta para a outra família de endereços se a atual estiver perdendo muito
+                self._checkAddressFallback()
+
+        except GameOver as gameOver:
+            if gameOver.status == 0:
+                logger.info("JOGO FINALIZADO.")
+                logger.info("SCORE: %s", gameOver.score)
+                await self._gameTerminationRequest()
+            else:
+                logger.info("JOGO ENCERRADO: %s", gameOver.description)
+            return self._gameResult(
+                gameOver.status, description=gameOver.description, score=gameOver.score
+            )
+        except DeadlineExceeded as e:
+            # Servidor sem resposta: o jogo é abandonado (o quit também tem prazo)
+            self._budgetExhausted(e.phase, "abort")
+            logger.error("Jogo abandonado: %s", e)
+            return self._gameResult(1, description=str(e))
+        finally:
+            cannonTask.cancel()
+            # Se o jogo for interrompido antes do fim, avisa o servidor
+            if not self._finished:
+                await self._gameTerminationRequest()
+            self._closeSockets()
+            # Escreve as métricas finais
+            if exporterTask is not None:
+                exporterTask.cancel()
+                self._metricsExporter.write()
+
+    def playGame(self):
+        """
+        Dá início ao jogo, executando playGameAsync em um event loop próprio.
+        """
+        return asyncio.run(self.playGameAsync())
 
 
 if __name__ == "__main__":
-    # verifica se o número de argumentos é três
-    num_args = len(sys.argv)
-    if num_args != 4:
-        print(
-            "Parâmetros incorretos. Como usar: python client.py <hostname> <port 1> <GAS>"
+    parser = argparse.ArgumentParser(
+        description="Cliente do jogo Bridge Defense.",
+        usage="python client.py <hostname> <port 1> <GAS> [opções]",
+    )
+    parser.add_argument("hostname")
+    parser.add_argument("port", type=int, help="porta do primeiro rio")
+    parser.add_argument("gas")
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="DEBUG mostra também cada navio e cada tiro bem sucedido",
+    )
+    parser.add_argument("--log-file", default=None, help="escreve o log nesse arquivo")
+    parser.add_argument(
+        "--metrics-json", default=None, help="escreve as métricas nesse arquivo JSON"
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        default=None,
+        help="escreve as métricas nesse arquivo no formato texto do Prometheus",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=5.0,
+        help="intervalo (em segundos) entre as escritas das métricas",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="envia cópias redundantes de getturn conforme a perda de cada rio",
+    )
+    for phase, budget in DEFAULT_BUDGETS.items():
+        parser.add_argument(
+            f"--{phase}-budget",
+            type=float,
+            default=budget,
+            help=f"tempo máximo (em segundos) da fase {phase}, 0 para não limitar"
+            f" (padrão: {budget})",
         )
-        sys.exit(1)
-
-    # Obtém os argumentos a partir dos parâmetros do programa na linha de comando
-    host = sys.argv[1]
-    port = int(sys.argv[2])
-    gas = sys.argv[3]
+    parser.add_argument(
+        "--record", default=None, help="grava todos os datagramas do jogo nesse arquivo"
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        help="reproduz uma gravação em vez de usar a rede (hostname e porta são ignorados)",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=None,
+        help="reproduz respeitando os atrasos gravados, acelerados por esse fator"
+        " (padrão: o mais rápido possível)",
+    )
+    args = parser.parse_args()
 
     # Hostname: pugna.snes.dcc.ufmg.br
     # IPv4: 150.164.213.243
     # IPv6: 2804:1f4a:0dcc:ff03:0000:0000:0000:0001
     # GAS do grupo: 2021421869  :44:87407f792f59b7dde2bf51a0ae7216cf8c246a7169b52ac336bbf166938d91a1+2020054250  :44:50527ec32fc4c6fd5493533c67ce42f5fcad7bb59723976ff54acc6ae84385b8+2021421940  :44:a70a80b0528f580bb6c0a94ae37e3d8efdfb7adb9f939f3af675e9ea69694db4+f16d50fda86436470ba832a3f63525650dbd1fe021e867069f35ef4073d1b637
 
-    game = BridgeDefense(host, port, gas)
-    game.playGame()
+    logWriter = BackgroundLogWriter(getattr(logging, args.log_level), args.log_file)
+    logWriter.start()
+    recorder = DatagramRecorder(args.record) if args.record else None
+    try:
+        replay = DatagramReplay(args.replay, args.replay_speed) if args.replay else None
+        metrics = Metrics()
+        exporter = None
+        if args.metrics_json or args.metrics_prom:
+            exporter = MetricsExporter(
+                metrics, args.metrics_json, args.metrics_prom, args.metrics_interval
+            )
+        game = BridgeDefense(
+            args.hostname,
+            args.port,
+            args.gas,
+            metrics=metrics,
+            metricsExporter=exporter,
+            recorder=recorder,
+            replay=replay,
+            hedging=args.hedge,
+            budgets={
+                phase: getattr(args, f"{phase}_budget") or None
+                for phase in DEFAULT_BUDGETS
+            },
+        )
+        result = game.playGame()
+        if replay is not None and replay.mismatches:
+            logger.warning(
+                "%d envios que não estão na gravação ficaram sem resposta ou foram recusados",
+                replay.mismatches,
+            )
+    finally:
+        if recorder is not None:
+            recorder.close()
+        logWriter.stop()
+    sys.exit(0 if result["status"] == 0 else 1)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from client import BackgroundLogWriter, BridgeDefense, EndpointPool, logger
+
+
+def parseJob(text):
+    """
+    Lê um job no formato "host:porta:GAS" (o GAS pode conter ":"; hosts IPv6 vão
+    entre colchetes, como em "[::1]:52221:GAS").
+    """
+    if text.startswith("["):
+        host, rest = text[1:].split("]:", 1)
+    else:
+        host, rest = text.split(":", 1)
+    port, gas = rest.split(":", 1)
+    return host, int(port), gas
+
+
+def readJobs(path):
+    """
+    Lê um arquivo com um job "host porta GAS" por linha (linhas vazias e iniciadas
+    por "#" são ignoradas).
+    """
+    jobs = []
+    with open(path) as jobsFile:
+        for line in jobsFile:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            host, port, gas = line.split(None, 2)
+            jobs.append((host, int(port), gas))
+    return jobs
+
+
+async def playGames(jobs):
+    """
+    Joga todos os jobs ao mesmo tempo no event loop atual. Os jogos compartilham os
+    sockets (um por servidor) através de um EndpointPool.
+
+    Retorna os resultados na ordem dos jobs. O fim de um jogo (ou um erro inesperado
+    nele) não interrompe os demais.
+    """
+    pool = EndpointPool()
+    games = [
+        BridgeDefense(host, port, gas, endpointPool=pool) for host, port, gas in jobs
+    ]
+    try:
+        results = await asyncio.gather(
+            *(game.playGameAsync() for game in games), return_exceptions=True
+        )
+    finally:
+        pool.close()
+
+    for k, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error("Erro no jogo do GAS %s: %r", jobs[k][2], result)
+            results[k] = {
+                "gas": jobs[k][2],
+                "status": 1,
+                "description": repr(result),
+                "score": None,
+                "turns": games[k]._currentTurn,
+            }
+    return results
+
+
+def playChunk(jobs, logLevel):
+    """
+    Ponto de entrada de cada processo do pool: joga a sua parte dos jobs em um event
+    loop próprio.
+    """
+    logWriter = BackgroundLogWriter(logLevel)
+    logWriter.start()
+    try:
+        return asyncio.run(playGames(jobs))
+    finally:
+        logWriter.stop()
+
+
+def runJobs(jobs, processes, logLevel=logging.WARNING):
+    """
+    Distribui os jobs entre os processos (um event loop por processo) e retorna os
+    resultados na ordem dos jobs.
+    """
+    processes = max(1, min(processes, len(jobs)))
+    if processes == 1:
+        return playChunk(jobs, logLevel)
+
+    # Divisão intercalada: o job k vai para o processo k % processes
+    chunks = [jobs[k::processes] for k in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        chunkResults = list(executor.map(playChunk, chunks, [logLevel] * processes))
+
+    results = [None] * len(jobs)
+    for k, chunk in enumerate(chunkResults):
+        results[k::processes] = chunk
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Joga várias partidas (host, porta, GAS) ao mesmo tempo."
+    )
+    parser.add_argument(
+        "jobs", nargs="*", help='jobs no formato "host:porta:GAS" ("[::1]:porta:GAS")'
+    )
+    parser.add_argument(
+        "--jobs-file",
+        default=None,
+        help='arquivo com um job "host porta GAS" por linha',
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="quantidade de processos (cada um joga a sua parte dos jobs em um event loop)",
+    )
+    parser.add_argument(
+        "--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"]
+    )
+    parser.add_argument(
+        "--output", default=None, help="salva os resultados nesse arquivo JSON"
+    )
+    args = parser.parse_args()
+
+    jobs = [parseJob(job) for job in args.jobs]
+    if args.jobs_file:
+        jobs += readJobs(args.jobs_file)
+    if not jobs:
+        parser.error("nenhum job informado")
+
+    results = runJobs(jobs, args.processes, getattr(logging, args.log_level))
+
+    for result in results:
+        score = result["score"] or {}
+        print(
+            f"{result['gas']}: status {result['status']}, {result['turns']} turnos,"
+            f" {score.get('sunk_ships')} afundados, {score.get('escaped_ships')} escaparam"
+            + (f" ({result['description']})" if result["description"] else "")
+        )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"Resultados salvos em {args.output}")
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+
+# Perfis de rede que imitam as execuções easy/medium/hard registradas nos transcripts
+# (ipv4-*.txt e ipv6-*.txt). Todos os valores se aplicam a cada datagrama, nos dois
+# sentidos: loss, reorder e duplicate são probabilidades, delay e jitter são segundos.
+PROFILES = {
+    # Sem perdas nem atrasos: útil para medir o custo de CPU do cliente
+    "perfect": {
+        "loss": 0.0,
+        "delay": 0.0,
+        "jitter": 0.0,
+        "reorder": 0.0,
+        "duplicate": 0.0,
+    },
+    # Rede limpa: praticamente nenhum timeout
+    "easy": {
+        "loss": 0.0,
+        "delay": 0.002,
+        "jitter": 0.002,
+        "reorder": 0.0,
+        "duplicate": 0.0,
+    },
+    # Latência alta e variável: alguns timeouts, quase sem perdas
+    "medium": {
+        "loss": 0.005,
+        "delay": 0.15,
+        "jitter": 0.3,
+        "reorder": 0.02,
+        "duplicate": 0.01,
+    },
+    # Perdas frequentes: a maior parte dos getturn precisa ser retransmitida
+    "hard": {
+        "loss": 0.15,
+        "delay": 0.03,
+        "jitter": 0.05,
+        "reorder": 0.05,
+        "duplicate": 0.05,
+    },
+}
+
+HULL_LIFE = {"frigate": 1, "destroyer": 2, "battleship": 3}
+# Chance de um navio novo entrar em cada rio a cada turno
+SPAWN_PROBABILITY = 0.6
+
+
+class Game:
+    """
+    Estado de um jogo (um por GAS), compartilhado pelos quatro servidores (rios).
+    """
+
+    def __init__(self, gas, rng, last_turn):
+        self.gas = gas
+        self._rng = rng
+        self.last_turn = last_turn
+        self.turn = 0
+        self.next_id = 1
+        self.authenticated = set()
+        self.cannons = self._placeCannons()
+        # rivers x bridges
+        self.ships = [[[] for _ in range(8)] for _ in range(4)]
+        self.shots_this_turn = set()
+        self.score = {
+            "last_turn": last_turn,
+            "tstamp_auth_start": time.time(),
+            "servers_authenticated": [],
+            "getcannons_received": 0,
+            "cannons": self.cannons,
+            "getturn_received": 0,
+            "ship_moves": 0,
+            "shot_received": 0,
+            "valid_shots": 0,
+            "sunk_ships": 0,
+            "escaped_ships": 0,
+            "remaining_life_on_escaped_ships": 0,
+        }
+        self._spawn()
+
+    def _placeCannons(self):
+        cells = [[x, y] for x in range(1, 9) for y in range(0, 5)]
+        return self._rng.sample(cells, 8)
+
+    def _spawn(self):
+        for river in range(4):
+            if self._rng.random() < SPAWN_PROBABILITY:
+                hull = self._rng.choice(list(HULL_LIFE))
+                self.ships[river][0].append(
+                    {"id": self.next_id, "hull": hull, "hits": 0}
+                )
+                self.next_id += 1
+
+    def advance(self, turn):
+        """
+        Avança o jogo até o turno informado (o servidor nunca volta no tempo).
+        """
+        while self.turn < turn:
+            for river in range(4):
+                escaped = self.ships[river][7]
+                self.score["escaped_ships"] += len(escaped)
+                for ship in escaped:
+                    self.score["remaining_life_on_escaped_ships"] += (
+                        HULL_LIFE[ship["hull"]] - ship["hits"]
+                    )
+                for bridge in range(7, 0, -1):
+                    moving = self.ships[river][bridge - 1]
+                    self.score["ship_moves"] += len(moving)
+                    self.ships[river][bridge] = moving
+                self.ships[river][0] = []
+            self.turn += 1
+            self.shots_this_turn = set()
+            self._spawn()
+
+    def shoot(self, river, cannon, ship_id):
+        self.score["shot_received"] += 1
+        if cannon not in self.cannons:
+            return "cannon not found"
+        if tuple(cannon) in self.shots_this_turn:
+            return "cannon already shot this turn"
+        x, y = cannon
+        if river not in (y - 1, y):
+            return "ship out of range"
+        ships = self.ships[river][x - 1]
+        for ship in ships:
+            if ship["id"] == ship_id:
+                break
+        else:
+            return "ship not found"
+        self.shots_this_turn.add(tuple(cannon))
+        self.score["valid_shots"] += 1
+        ship["hits"] += 1
+        if ship["hits"] >= HULL_LIFE[ship["hull"]]:
+            ships.remove(ship)
+            self.score["sunk_ships"] += 1
+        return None
+
+
+class RiverServerProtocol(asyncio.DatagramProtocol):
+    """
+    Servidor de um rio: responde às mensagens do protocolo na sua porta.
+    """
+
+    def __init__(self, server, river):
+        self._server = server
+        self._river = river
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            request = json.loads(data.decode())
+        except ValueError:
+            return
+        if self._server.dropRequest():
+            return
+        for response in self._server.handle(self._river, request):
+            self._server.send(self.transport, response, addr)
+
+
+class BridgeDefenseServer:
+    """
+    Servidor local que fala o mesmo protocolo do servidor da disciplina em quatro
+    portas consecutivas (uma por rio), simulando perdas, atrasos, reordenação e
+    duplicação de datagramas de acordo com o perfil informado.
+
+    Com a mesma semente, o jogo (canhões e navios) é sempre o mesmo.
+    """
+
+    def __init__(self, profile, seed=None, last_turn=272):
+        self._profile = profile
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._last_turn = last_turn
+        self._games = {}
+        self._loop = None
+        self._stopped = None
+
+    def dropRequest(self):
+        """
+        Decide se um datagrama recebido do cliente é perdido.
+        """
+        return self._rng.random() < self._profile["loss"]
+
+    def handle(self, river, request):
+        """
+        Processa uma requisição recebida no rio informado e retorna a lista de respostas.
+        """
+        gas = request.get("auth")
+        kind = request.get("type")
+
+        if kind == "authreq":
+            game = self._games.get(gas)
+            if game is None:
+                game = Game(gas, random.Random(self._rng.random()), self._last_turn)
+                self._games[gas] = game
+            game.authenticated.add(river)
+            game.score["servers_authenticated"] = sorted(
+                r + 1 for r in game.authenticated
+            )
+            if len(game.authenticated) == 4:
+                game.score["tstamp_auth_completion"] = time.time()
+            return [{"type": "authresp", "auth": gas, "status": 0}]
+
+        game = self._games.get(gas)
+        if game is None:
+            return [self._gameover(gas, 1, description=f"Client {gas} is unknown")]
+
+        if kind == "getcannons":
+            game.score["getcannons_received"] += 1
+            return [{"type": "cannons", "auth": gas, "cannons": game.cannons}]
+
+        if kind == "getturn":
+            turn = request.get("turn", 0)
+            game.score["getturn_received"] += 1
+            if turn > game.last_turn:
+                game.score["tstamp_completion"] = time.time()
+                return [self._gameover(gas, 0, score=game.score)]
+            game.advance(turn)
+            return [
+                {
+                    "type": "state",
+                    "auth": gas,
+                    "turn": game.turn,
+                    "bridge": bridge + 1,
+                    "ships": [dict(ship) for ship in game.ships[river][bridge]],
+                }
+                for bridge in range(8)
+            ]
+
+        if kind == "shot":
+            cannon = request.get("cannon")
+            ship_id = request.get("id")
+            error = game.shoot(river, cannon, ship_id)
+            response = {
+                "type": "shotresp",
+                "auth": gas,
+                "cannon": cannon,
+                "id": ship_id,
+                "status": 0 if error is None else 1,
+            }
+            if error is not None:
+                response["description"] = error
+            return [response]
+
+        if kind == "quit":
+            del self._games[gas]
+            return [self._gameover(gas, 1, description="Received a quit message")]
+
+        return [self._gameover(gas, 1, description=f"Unknown message type {kind}")]
+
+    def _gameover(self, gas, status, score=None, description=None):
+        response = {"type": "gameover", "auth": gas, "status": status}
+        if score is not None:
+            response["score"] = score
+        if description is not None:
+            response["description"] = description
+        return response
+
+    def send(self, transport, response, addr):
+        """
+        Envia uma resposta aplicando as perdas, atrasos e duplicações do perfil.
+        """
+        data = json.dumps(response).encode()
+        copies = 2 if self._rng.random() < self._profile["duplicate"] else 1
+        for _ in range(copies):
+            if self._rng.random() < self._profile["loss"]:
+                continue
+            delay = (
+                self._profile["delay"] + self._rng.random() * self._profile["jitter"]
+            )
+            # Um datagrama "reordenado" é segurado o suficiente para chegar depois dos seguintes
+            if self._rng.random() < self._profile["reorder"]:
+                delay += self._profile["delay"] * 4 + 0.01
+            if delay <= 0:
+                transport.sendto(data, addr)
+            else:
+                self._loop.call_later(delay, transport.sendto, data, addr)
+
+    async def serve(self, host, port1):
+        """
+        Atende os quatro rios nas portas port1..port1 + 3 até que stop seja chamado.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        transports = []
+        for river in range(4):
+            transport, _ = await self._loop.create_datagram_endpoint(
+                lambda river=river: RiverServerProtocol(self, river),
+                local_addr=(host, port1 + river),
+            )
+            transports.append(transport)
+        try:
+            await self._stopped.wait()
+        finally:
+            for transport in transports:
+                transport.close()
+
+    def stop(self):
+        """
+        Encerra serve (pode ser chamado de outra thread).
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de Bridge Defense.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=52221)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="easy")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--last-turn", type=int, default=272)
+    # Permitem sobrescrever valores do perfil escolhido
+    for key in ("loss", "delay", "jitter", "reorder", "duplicate"):
+        parser.add_argument(f"--{key}", type=float, default=None)
+    args = parser.parse_args()
+
+    profile = dict(PROFILES[args.profile])
+    for key in profile:
+        if getattr(args, key) is not None:
+            profile[key] = getattr(args, key)
+
+    server = BridgeDefenseServer(profile, args.seed, args.last_turn)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        sys.exit(0)
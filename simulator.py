@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from client import Board, CoverageIndex, greedyTargeting, optimalTargeting
+from server import Game
+
+# Estratégias de mira disponíveis pelo nome (outras podem ser dadas como "módulo:função")
+POLICIES = {"greedy": greedyTargeting, "optimal": optimalTargeting}
+
+# Resultados somados de cada jogo
+FIELDS = (
+    "sunk_ships",
+    "escaped_ships",
+    "remaining_life_on_escaped_ships",
+    "valid_shots",
+)
+
+
+def loadPolicy(name):
+    """
+    Obtém uma estratégia de mira pelo nome ou no formato "módulo:função".
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    moduleName, _, functionName = name.partition(":")
+    return getattr(importlib.import_module(moduleName), functionName)
+
+
+def simulateGame(seed, targeting, lastTurn=272):
+    """
+    Joga uma partida inteira em memória com o Game do servidor local (as mesmas
+    regras de movimento, fuga e validação dos tiros), sem rede: a cada turno a
+    estratégia de mira escolhe os tiros a partir do mesmo Board e CoverageIndex usados
+    pelo cliente.
+
+    Retorna um dicionário com os campos de FIELDS.
+    """
+    game = Game("simulator", random.Random(seed), lastTurn)
+    coverage = CoverageIndex(game.cannons)
+    board = Board()
+
+    for turn in range(lastTurn + 1):
+        game.advance(turn)
+
+        # Só as pontes com navios precisam ser informadas ao tabuleiro
+        for river in range(4):
+            board.updateRiver(
+                river,
+                [
+                    {"bridge": bridge + 1, "ships": cell}
+                    for bridge, cell in enumerate(game.ships[river])
+                    if cell
+                ],
+            )
+
+        for river, cannon, slot in targeting(coverage, board):
+            game.shoot(river, list(cannon), board.ids[slot])
+
+    return {field: game.score[field] for field in FIELDS}
+
+
+def _simulateChunk(job):
+    policyName, seeds, lastTurn = job
+    targeting = loadPolicy(policyName)
+    return [simulateGame(seed, targeting, lastTurn) for seed in seeds]
+
+
+def evaluate(policyName, seeds, lastTurn=272, processes=None, chunkSize=64):
+    """
+    Simula um jogo por seed com a estratégia informada, distribuindo os jogos entre
+    os processos de um multiprocessing.Pool. Retorna os resultados na ordem das seeds.
+    """
+    jobs = [
+        (policyName, seeds[k : k + chunkSize], lastTurn)
+        for k in range(0, len(seeds), chunkSize)
+    ]
+    with multiprocessing.Pool(processes) as pool:
+        chunks = pool.map(_simulateChunk, jobs)
+    return [result for chunk in chunks for result in chunk]
+
+
+def meanInterval(values):
+    """
+    Média e meia largura do intervalo de confiança de 95% (aproximação normal).
+    """
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, 0.0
+    variance = sum((value - mean) ** 2 for value in values) / (n - 1)
+    return mean, 1.96 * math.sqrt(variance / n)
+
+
+def summarize(results):
+    return {
+        field: meanInterval([result[field] for result in results]) for field in FIELDS
+    }
+
+
+def compare(baseline, candidate):
+    """
+    Diferença pareada (mesmas seeds) entre duas estratégias, campo a campo.
+    """
+    return {
+        field: meanInterval([b[field] - a[field] for a, b in zip(baseline, candidate)])
+        for field in FIELDS
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simula partidas offline para comparar estratégias de mira."
+    )
+    parser.add_argument(
+        "--policies",
+        default="greedy,optimal",
+        help="estratégias separadas por vírgula (%s ou módulo:função); a primeira é a"
+        " referência das comparações" % ", ".join(sorted(POLICIES)),
+    )
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument(
+        "--turns", type=int, default=272, help="último turno de cada jogo"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed do primeiro jogo")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--output", default=None, help="salva o resumo nesse arquivo JSON"
+    )
+    args = parser.parse_args()
+
+    seeds = list(range(args.seed, args.seed + args.games))
+    policies = args.policies.split(",")
+    report = {
+        "games": args.games,
+        "turns": args.turns,
+        "seed": args.seed,
+        "policies": {},
+    }
+    baseline = None
+    for policyName in policies:
+        start = time.perf_counter()
+        results = evaluate(policyName, seeds, args.turns, args.processes)
+        elapsed = time.perf_counter() - start
+
+        summary = summarize(results)
+        print(
+            f"[{policyName}] {args.games} jogos em {elapsed:.2f} s"
+            f" ({args.games / elapsed:.0f} jogos/s)"
+        )
+        for field, (mean, interval) in summary.items():
+            print(f"    {field:<32} {mean:>9.2f} ± {interval:.2f}")
+        entry = {"elapsed_s": elapsed, "summary": summary}
+
+        if baseline is None:
+            baseline = results
+        else:
+            difference = compare(baseline, results)
+            print(f"    diferença para {policies[0]}:")
+            for field, (mean, interval) in difference.items():
+                print(f"    {field:<32} {mean:>+9.2f} ± {interval:.2f}")
+            entry["difference"] = difference
+        report["policies"][policyName] = entry
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Resultados salvos em {args.output}")